@@ -1,21 +1,113 @@
 # analysis.py
 import numpy as np, pandas as pd, logging
-from mpmath import erf, sqrt
+import datetime
+import metrics
+from greeks import bs_greeks
+from montecarlo import mc_price, mc_price_parallel, spawn_streams, symbol_streams
 
-def monte_carlo_price(S0, sigma, r=0.05, T=30/252, K=None, N=20000):
+# Cột điều khoản hợp đồng (contracts.attach_contracts) để định giá theo mã cơ sở thật
+CONTRACT_INPUTS = ('underlying_close', 'underlying_sigma', 'strike', 'ratio', 'maturity_date')
+
+@metrics.timed('pricing', method='monte_carlo')
+def monte_carlo_price(S0, sigma, r=0.05, T=30/252, K=None, N=20000, seed=None, symbol=None):
+    # Payoff châu Âu: chỉ cần giá cuối kỳ, mô phỏng theo khối (xem montecarlo.mc_price)
     if K is None: K = S0
-    dt = T / (252 * T)
-    paths = S0 * np.exp(np.cumsum((r-0.5*sigma**2)*dt + sigma*np.sqrt(dt)*np.random.randn(N,int(252*T)), axis=1))
-    payoffs = np.maximum(paths[:,-1]-K, 0)
-    return np.exp(-r*T) * payoffs.mean()
+    # Có mã thì dùng luồng của mã đó như price_table để cùng seed cho cùng giá
+    if symbol is not None: seed = symbol_streams(seed, [symbol])[0]
+    return float(mc_price(S0, K, sigma, r, T, N=N, seed=seed)['price'])
 
 def bs_delta(S, K, sigma, r=0.05, T=30/252):
-    d1 = (np.log(S/K)+(r+0.5*sigma**2)*T)/(sigma*np.sqrt(T))
-    return 0.5*(1+erf(d1/sqrt(2)))
+    return bs_greeks(S, K, sigma, r, T)['delta'][()]
 
 def kelly_fraction(edge, win_prob, loss_prob, payoff_ratio):
     return (win_prob * payoff_ratio - loss_prob) / payoff_ratio
 
+@metrics.timed('pricing', method='batch')
+def batch_price(S0, K, sigma, r=0.05, T=30/252, ratio=1, N=20000, market_price=None, seed=None, workers=None,
+                symbols=None):
+    """Định giá đồng loạt nhiều chứng quyền trong một lượt NumPy.
+
+    S0, K, sigma, r, T, ratio là số hoặc mảng cùng độ dài. Payoff là kiểu châu Âu nên chỉ
+    mô phỏng giá cuối kỳ, theo từng khối với bộ nhớ cố định (montecarlo.mc_price).
+    market_price mặc định là S0 (như các route hiện tại). Trả về dict các mảng model_price
+    (đã chia tỷ lệ chuyển đổi), delta và kelly. seed cố định kết quả: mỗi mã dùng một luồng con
+    tách từ seed, nên giá một mã không phụ thuộc các mã khác trong lô; truyền symbols thì luồng suy ra
+    từ chính mã (montecarlo.symbol_streams) nên còn không phụ thuộc vị trí trong lô. Nếu truyền workers thì chạy
+    song song trên nhiều tiến trình (montecarlo.mc_price_parallel), kết quả giống hệt đường tuần tự.
+    """
+    if market_price is None: market_price = S0
+    S0, K, sigma, r, T, ratio, market_price = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (S0, K, sigma, r, T, ratio, market_price)))
+    metrics.inc('priced_options_total', S0.size, method='batch')
+    # Mỗi mã một luồng con: cùng giá với mọi số workers và không đổi khi lô thêm/bớt mã
+    streams = symbol_streams(seed, symbols) if symbols is not None else spawn_streams(seed, S0.size)
+    if workers is None:
+        model_price = mc_price(S0, K, sigma, r, T, ratio, N=N, seed=streams)['price']
+    else:
+        model_price = mc_price_parallel(S0, K, sigma, r, T, ratio, seed=streams, workers=workers, N=N)['price']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        edge = np.abs(market_price - model_price) / market_price
+    delta = bs_greeks(S0, K, sigma, r, T, ratio=ratio)['delta']
+    kelly = np.broadcast_to(kelly_fraction(edge, 0.55, 0.45, payoff_ratio=1), S0.shape).astype(float)
+    return {"model_price": model_price, "delta": delta, "kelly": kelly}
+
+def time_to_maturity(maturity_date, today=None, default=30/252):
+    """Thời gian còn lại (năm, 365 ngày) tới ngày đáo hạn, tối thiểu 1/252; thiếu ngày thì dùng default."""
+    today = pd.Timestamp(today or datetime.date.today())
+    days = (pd.to_datetime(pd.Series(maturity_date), errors='coerce') - today).dt.days.to_numpy(dtype=float)
+    return np.where(np.isnan(days), default, np.maximum(days / 365, 1/252))
+
+def price_table(df, r=0.05, T=30/252, N=20000, seed=None, workers=None, today=None):
+    """Định giá cả bảng (cột symbol, close, sigma) bằng batch_price.
+
+    Nếu bảng có điều khoản hợp đồng (underlying_close, underlying_sigma, strike, ratio, maturity_date,
+    xem contracts.attach_contracts) thì mã đủ thông tin được định giá theo mã cơ sở thật với giá
+    thị trường là giá chứng quyền, kể cả khi chứng quyền chưa đủ lịch sử để có sigma riêng; mã thiếu
+    thông tin định giá như cũ (S0 = K = giá chứng quyền, T cố định) và cần có sigma.
+    """
+    df = df.dropna(subset=['close'])
+    contract = all(c in df for c in CONTRACT_INPUTS)
+    has = df[list(CONTRACT_INPUTS)].notna().all(axis=1) if contract else pd.Series(False, index=df.index)
+    # Sigma lịch sử của chính chứng quyền chỉ cần cho mã định giá theo cách cũ
+    keep = has | df['sigma'].notna()
+    df, has = df[keep], has[keep].to_numpy()
+    close = df['close'].to_numpy(dtype=float)
+    S0, K, sigma, ratio, TT = close, close, df['sigma'].to_numpy(dtype=float), 1.0, T
+    if contract:
+        terms = df[list(CONTRACT_INPUTS)]
+        S0 = np.where(has, terms['underlying_close'].to_numpy(dtype=float), close)
+        K = np.where(has, terms['strike'].to_numpy(dtype=float), close)
+        sigma = np.where(has, terms['underlying_sigma'].to_numpy(dtype=float), sigma)
+        ratio = np.where(has, terms['ratio'].to_numpy(dtype=float), 1.0)
+        TT = np.where(has, time_to_maturity(terms['maturity_date'], today, T), T)
+    res = batch_price(S0, K, sigma, r, TT, ratio, N=N, market_price=close, seed=seed, workers=workers,
+                      symbols=df['symbol'].to_numpy())
+    out = pd.DataFrame({
+        'symbol': df['symbol'].to_numpy(),
+        'market_price': close,
+        'model_price': res['model_price'],
+        'delta': res['delta'],
+        'kelly': res['kelly'],
+    })
+    out['action'] = np.where(out['model_price'] > out['market_price'], "LONG", "SHORT")
+    out['profit'] = out['model_price'] - out['market_price']
+    return out
+
+def with_market_prices(table, quotes):
+    """Thay market_price của bảng price_table bằng giá thị trường trực tiếp (bảng symbol, market_price)
+    rồi tính lại kelly, action, profit; mã không có giá giữ giá đóng cửa. price_source cho biết nguồn giá."""
+    if quotes is None or len(quotes) == 0:
+        return table
+    live = table['symbol'].map(quotes.drop_duplicates('symbol', keep='last').set_index('symbol')['market_price'])
+    live = live.where(live > 0)
+    out = table.assign(market_price=live.fillna(table['market_price']), price_source=np.where(live.notna(), 'ssi', 'close'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        edge = (out['market_price'] - out['model_price']).abs() / out['market_price']
+    out['kelly'] = np.broadcast_to(kelly_fraction(edge, 0.55, 0.45, payoff_ratio=1), len(out)).astype(float)
+    out['action'] = np.where(out['model_price'] > out['market_price'], "LONG", "SHORT")
+    out['profit'] = out['model_price'] - out['market_price']
+    return out
+
 def analyze(df):
     S0=df['close'].iloc[-1]; sigma=df['vol'].iloc[-1]/100
     r=0.05; T=30/252; K=S0
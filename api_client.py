@@ -1,7 +1,86 @@
 # api_client.py
+import logging
+import os
+import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import metrics
+from fetch_pipeline import fetch_many
 
-def ssi_warrant_price(symbol, api_key):
-    headers = {'Authorization': f'Bearer {api_key}'}
-    url = f"https://api.ssi.com.vn/market/warrant/{symbol}"
-    return requests.get(url, headers=headers).json()['price']
+# Đổi SSI_BASE_URL (biến môi trường hoặc tham số) để chạy với server giả lập cục bộ
+SSI_BASE_URL = os.environ.get('SSI_BASE_URL', 'https://api.ssi.com.vn')
+
+class SSIClient:
+    """Client SSI dùng chung một requests.Session (giữ kết nối keep-alive trong pool).
+
+    Mọi yêu cầu có timeout (kết nối, đọc); lỗi kết nối và mã 429/5xx được thử lại với backoff
+    lũy thừa ngay trong adapter, có tôn trọng Retry-After. Thời gian, lỗi và số lần adapter thử lại
+    được ghi vào metrics với endpoint='ssi'.
+    """
+
+    def __init__(self, api_key=None, base_url=None, timeout=(3.05, 10), retries=3, backoff=0.5,
+                 pool_size=16, max_workers=8, rate=20.0):
+        self.base_url = (base_url or SSI_BASE_URL).rstrip('/')
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.rate = rate
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        api_key = api_key or os.environ.get('SSI_API_KEY')
+        if api_key:
+            self.session.headers['Authorization'] = f'Bearer {api_key}'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def get(self, path, **params):
+        with metrics.timer('provider_request', endpoint='ssi'):
+            resp = self.session.get(f'{self.base_url}/{path.lstrip("/")}', params=params or None, timeout=self.timeout)
+            retries = getattr(resp.raw, 'retries', None)
+            if retries is not None and retries.history:
+                metrics.inc('provider_retries_total', len(retries.history), endpoint='ssi')
+            resp.raise_for_status()
+            return resp.json()
+
+    def quote(self, symbol):
+        """Giá hiện tại của một chứng quyền."""
+        return float(self.get(f'market/warrant/{symbol.upper()}')['price'])
+
+    def quotes(self, symbols):
+        """Giá của nhiều mã, gọi song song qua pool kết nối. Trả về bảng symbol, market_price của các mã lấy được."""
+        # Việc thử lại đã do adapter đảm nhận nên fetch_many không thử lại thêm
+        prices, _ = fetch_many(self.quote, [str(s).upper() for s in symbols], max_workers=self.max_workers,
+                               rate=self.rate, burst=self.max_workers, retries=0)
+        return pd.DataFrame({'symbol': list(prices), 'market_price': list(prices.values())},
+                            columns=['symbol', 'market_price'])
+
+_clients = {}
+
+def default_client(api_key=None):
+    """Client dùng chung trong tiến trình theo từng api_key (giữ kết nối giữa các lần gọi)."""
+    if api_key not in _clients:
+        _clients[api_key] = SSIClient(api_key)
+    return _clients[api_key]
+
+def market_quotes(symbols, api_key=None):
+    """Giá SSI của nhiều mã (symbol, market_price); mã lỗi bị bỏ qua, lỗi cả lô thì trả về bảng rỗng."""
+    try:
+        return default_client(api_key).quotes(symbols)
+    except Exception as e:
+        logging.warning("Không lấy được giá SSI: %s", e)
+        metrics.count_error('ssi_quotes', e)
+        return pd.DataFrame(columns=['symbol', 'market_price'])
+
+def ssi_warrant_price(symbol, api_key=None):
+    return default_client(api_key).quote(symbol)
@@ -0,0 +1,151 @@
+# backtest.py
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np, pandas as pd
+from greeks import bs_greeks
+from analysis import kelly_fraction
+from realized_vol import long_to_panel, realized_vol, SIGMA_ESTIMATOR, SIGMA_WINDOW, ANNUALIZE
+from history_store import default_store
+from contracts import CONTRACT_COLUMNS
+from warrant_store import underlying_of
+
+# Phí giao dịch mỗi chiều (tỷ lệ trên giá trị khớp)
+FEE = 0.0015
+
+def load_data(symbols=None, contracts=None, start=None, end=None, store=None):
+    """Dữ liệu backtest từ kho nến: panel chứng quyền, panel mã cơ sở và điều khoản.
+
+    contracts: bảng điều khoản (CONTRACT_COLUMNS, như contracts.load_contracts); None thì mọi mã
+    được định giá như price_table khi thiếu điều khoản (S0 = K = giá chứng quyền).
+    symbols None: mọi mã chứng quyền (bắt đầu bằng C) có trong kho.
+    """
+    store = store or default_store()
+    bars = store.read_all(start=start, end=end)
+    if symbols is None:
+        symbols = sorted(s for s in bars['symbol'].unique() if underlying_of(s) != 'UNKNOWN')
+    symbols = [str(s).upper() for s in symbols]
+    terms = pd.DataFrame(columns=CONTRACT_COLUMNS) if contracts is None else contracts.reindex(columns=CONTRACT_COLUMNS)
+    terms = terms.drop_duplicates('symbol', keep='last').set_index('symbol').reindex(symbols)
+    terms['underlying'] = terms['underlying'].fillna(pd.Series(symbols, index=symbols).map(underlying_of))
+    warrants = long_to_panel(bars[bars['symbol'].isin(symbols)])
+    underlyings = long_to_panel(bars[bars['symbol'].isin(set(terms['underlying']))])
+    return {'warrants': warrants, 'underlyings': underlyings, 'terms': terms}
+
+def signals(data, r=0.05, T=30/252, estimator=SIGMA_ESTIMATOR, window=SIGMA_WINDOW):
+    """Giá mô hình, tín hiệu (+1 LONG, -1 SHORT) và Kelly theo ngày x mã, chỉ dùng dữ liệu tới ngày đó.
+
+    Cùng quy tắc với analysis.price_table, nhưng giá mô hình là Black-Scholes dạng đóng (giá trị
+    mà Monte Carlo hội tụ tới) để tính cả panel trong một lượt NumPy.
+    """
+    close = data['warrants']['close']
+    dates, symbols = close.index, close.columns
+    terms = data['terms'].reindex(symbols)
+    sigma = realized_vol(data['warrants'], estimator, window)
+    S, K, sig, ratio = close, close, sigma, pd.DataFrame(1.0, index=dates, columns=symbols)
+    TT = pd.DataFrame(T, index=dates, columns=symbols)
+    und = terms['underlying'].to_numpy()
+    if len(data['underlyings']['close'].columns):
+        und_close = data['underlyings']['close'].reindex(index=dates).ffill()
+        und_sigma = realized_vol(data['underlyings'], estimator, window).reindex(index=dates).ffill()
+        und_close = und_close.reindex(columns=und).set_axis(symbols, axis=1)
+        und_sigma = und_sigma.reindex(columns=und).set_axis(symbols, axis=1)
+        strike = terms['strike'].to_numpy(dtype=float)
+        # Giá thực hiện tính bằng đồng thì đổi về nghìn đồng như giá lịch sử
+        scale = np.where(strike > 100 * und_close.median().to_numpy(), 1000.0, 1.0)
+        days = (pd.to_datetime(terms['maturity_date']).to_numpy()[None, :] - dates.to_numpy()[:, None]) / np.timedelta64(1, 'D')
+        T_contract = pd.DataFrame(np.maximum(days / 365, 1/252), index=dates, columns=symbols)
+        has = und_close.notna() & und_sigma.notna() & np.isfinite(strike) & terms['ratio'].notna().to_numpy() & np.isfinite(days)
+        S = und_close.where(has, close)
+        K = pd.DataFrame(np.broadcast_to(strike / scale, close.shape), index=dates, columns=symbols).where(has, close)
+        sig = und_sigma.where(has, sigma)
+        ratio = ratio.where(~has, np.broadcast_to(terms['ratio'].to_numpy(dtype=float), close.shape))
+        TT = T_contract.where(has, TT)
+        # Sau ngày đáo hạn thì không còn giao dịch
+        close = close.where(~(has & (days < 0)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        model = bs_greeks(S.to_numpy(), K.to_numpy(), sig.to_numpy(), r, TT.to_numpy(), ratio=ratio.to_numpy())['price']
+        model = pd.DataFrame(model, index=dates, columns=symbols).where(close.notna())
+        edge = (close - model).abs() / close
+    signal = np.sign(model - close).where(model.notna() & close.notna(), 0.0)
+    kelly = pd.DataFrame(np.broadcast_to(kelly_fraction(edge, 0.55, 0.45, payoff_ratio=1), close.shape),
+                         index=dates, columns=symbols).where(signal != 0, 0.0)
+    return {'model_price': model, 'signal': signal, 'kelly': kelly, 'close': close}
+
+def simulate(sig, kelly_scale=1.0, allow_short=False, fee=FEE, max_gross=1.0):
+    """Vị thế, P&L, vòng quay và sụt giảm từ tín hiệu của signals().
+
+    Tỷ trọng = tín hiệu x Kelly x kelly_scale, tổng tỷ trọng tuyệt đối mỗi ngày không vượt max_gross.
+    Vị thế quyết định ở giá đóng cửa ngày t được hưởng lợi suất từ t tới t+1; phí tính trên vòng quay.
+    """
+    signal = sig['signal'] if allow_short else sig['signal'].clip(lower=0)
+    weight = signal * sig['kelly'] * kelly_scale
+    gross = weight.abs().sum(axis=1)
+    weight = weight.div(np.maximum(gross / max_gross, 1.0), axis=0)
+    # Lợi suất chỉ tính khi có giá ở cả hai ngày (mã hết giao dịch thì coi như đóng vị thế)
+    ret = sig['close'].pct_change(fill_method=None).fillna(0.0)
+    position = weight.shift(1).fillna(0.0)
+    turnover = (weight - position).abs().sum(axis=1)
+    pnl = (position * ret).sum(axis=1) - fee * turnover
+    equity = (1 + pnl).cumprod()
+    drawdown = equity / equity.cummax() - 1
+    return {'weight': weight, 'pnl': pnl, 'equity': equity, 'drawdown': drawdown, 'turnover': turnover,
+            'summary': summarize(pnl, equity, drawdown, turnover, position)}
+
+def summarize(pnl, equity, drawdown, turnover, position):
+    n = len(pnl)
+    years = n / ANNUALIZE if n else np.nan
+    std = pnl.std()
+    traded = position.abs().sum(axis=1) > 0
+    return {
+        'total_return': float(equity.iloc[-1] - 1) if n else 0.0,
+        'cagr': float(equity.iloc[-1] ** (1 / years) - 1) if n and equity.iloc[-1] > 0 else np.nan,
+        'sharpe': float(pnl.mean() / std * np.sqrt(ANNUALIZE)) if std > 0 else np.nan,
+        'max_drawdown': float(drawdown.min()) if n else 0.0,
+        'avg_turnover': float(turnover.mean()) if n else 0.0,
+        'hit_rate': float((pnl[traded] > 0).mean()) if traded.any() else np.nan,
+        'days': n,
+    }
+
+def backtest(data, r=0.05, T=30/252, estimator=SIGMA_ESTIMATOR, window=SIGMA_WINDOW, kelly_scale=1.0,
+             allow_short=False, fee=FEE):
+    """Chạy một backtest trên toàn bộ panel: trả về dict signals + kết quả simulate (summary là các chỉ số tổng)."""
+    sig = signals(data, r, T, estimator, window)
+    return {**sig, **simulate(sig, kelly_scale, allow_short, fee)}
+
+_data = None
+_signal_cache = {}
+
+def _init_worker(data):
+    global _data
+    _data = data
+    _signal_cache.clear()
+
+def _run_params(params):
+    params = dict(params)
+    key = tuple(params.get(k) for k in ('r', 'T', 'estimator', 'window'))
+    sig_args = {k: params[k] for k in ('r', 'T', 'estimator', 'window') if k in params}
+    # Tín hiệu chỉ phụ thuộc (r, T, estimator, window): dùng lại cho các mức kelly_scale/phí khác nhau
+    if key not in _signal_cache:
+        _signal_cache[key] = signals(_data, **sig_args)
+    sim_args = {k: v for k, v in params.items() if k not in sig_args}
+    return {**params, **simulate(_signal_cache[key], **sim_args)['summary']}
+
+def sweep(data, grid, workers=None):
+    """Chạy backtest cho mọi tổ hợp tham số trong grid (dict tên -> danh sách giá trị) trên nhiều tiến trình.
+
+    Panel chỉ được gửi sang mỗi tiến trình một lần (initializer). Trả về bảng tham số + chỉ số, sắp theo sharpe.
+    """
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+    # Gom các tổ hợp có cùng tín hiệu vào cùng tiến trình để tận dụng cache
+    combos.sort(key=lambda p: tuple(str(p.get(k)) for k in ('r', 'T', 'estimator', 'window')))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(data)
+        rows = [_run_params(p) for p in combos]
+    else:
+        chunk = max(1, len(combos) // (workers * 4))
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(data,)) as ex:
+            rows = list(ex.map(_run_params, combos, chunksize=chunk))
+    return pd.DataFrame(rows).sort_values('sharpe', ascending=False, na_position='last').reset_index(drop=True)
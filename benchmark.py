@@ -0,0 +1,294 @@
+# benchmark.py
+"""Bộ đo hiệu năng chạy hoàn toàn offline: python benchmark.py [--sizes 50 200] [--json out.json]
+
+Dữ liệu giả lập có seed cố định (nến chứng quyền/mã cơ sở, băng lệnh, bảng giá) được phục vụ bởi
+một module vnstock giả đặt vào sys.modules, nên không gọi mạng. Đo monte_carlo_price, bs_delta,
+black_scholes_price, route /download, /download_trade và /analyze theo nhiều cỡ danh sách mã; kiểm
+tra độ chính xác so với Black-Scholes dạng đóng. Trả về mã thoát 1 nếu thông lượng hay sai số vượt
+ngưỡng (THRESHOLDS, hoặc so với --baseline với sai lệch cho phép --tolerance).
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import types
+import zlib
+import numpy as np, pandas as pd
+
+# Ngưỡng tối thiểu (thông lượng) / tối đa (sai số); đặt thấp hơn nhiều so với máy phát triển
+THRESHOLDS = {
+    'black_scholes_price.calls_per_s': ('min', 2000),
+    'bs_delta.calls_per_s': ('min', 2000),
+    'bs_greeks.options_per_s': ('min', 1e6),
+    'monte_carlo_price.paths_per_s': ('min', 5e6),
+    'accuracy.bs_max_abs_err': ('max', 1e-9),
+    'accuracy.delta_max_abs_err': ('max', 1e-5),
+    'accuracy.mc_max_z': ('max', 5.0),
+    'accuracy.mc_max_rel_err': ('max', 0.01),
+    # Tải dữ liệu bị chặn bởi token bucket: chỉ có ngưỡng tuyệt đối khi chạy với --fetch-rate
+    # (FETCH_RATE_FLOOR × tốc độ đó), ngược lại chỉ báo cáo và so với baseline
+    'download.symbols_per_s': ('min', None),
+    'download_trade.symbols_per_s': ('min', None),
+    'analyze.symbols_per_s': ('min', 20),
+    'analyze_warm.symbols_per_s': ('min', 200),
+}
+FETCH_RATE_FLOOR = 0.5
+UNDERLYINGS = ['ACB', 'FPT', 'HPG', 'MBB', 'MWG', 'STB', 'TCB', 'VHM', 'VNM', 'VPB']
+BARS = 300
+
+def _rng(name):
+    return np.random.default_rng(zlib.crc32(name.encode()))
+
+class FakeMarket:
+    """Thị trường giả lập tất định: mỗi mã sinh từ seed theo tên mã, giá chứng quyền theo Black-Scholes + nhiễu."""
+
+    def __init__(self, n_warrants, latency=0.0, today=None):
+        self.latency = latency
+        self.dates = pd.bdate_range(end=pd.Timestamp(today or datetime.date.today()), periods=BARS)
+        self.symbols = [f'C{UNDERLYINGS[i % len(UNDERLYINGS)]}{2400 + i}' for i in range(n_warrants)]
+        self.terms = {}
+        for sym in self.symbols:
+            rng = _rng(sym)
+            und = sym[1:4]
+            S = self.bars(und)['close'].iloc[-1]
+            self.terms[sym] = {'underlying': und, 'strike': round(S * rng.uniform(0.85, 1.15), 1),
+                               'ratio': int(rng.choice([1, 2, 4, 5, 10])),
+                               'maturity': self.dates[-1] + pd.Timedelta(days=int(rng.integers(30, 360)))}
+
+    def _sleep(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def bars(self, symbol):
+        rng = _rng(symbol)
+        if symbol in UNDERLYINGS:
+            close = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, BARS)))
+        else:
+            from greeks import bs_greeks
+            t = self.terms[symbol]
+            S = self.bars(t['underlying'])['close'].to_numpy()
+            T = np.maximum((t['maturity'] - self.dates).days.to_numpy() / 365, 1/252)
+            close = bs_greeks(S, t['strike'], 0.35, 0.05, T, ratio=t['ratio'])['price'] * np.exp(rng.normal(0, 0.05, BARS))
+            close = np.maximum(np.round(close, 2), 0.01)
+        return pd.DataFrame({'time': self.dates, 'open': close, 'high': close * 1.01, 'low': close * 0.99,
+                             'close': close, 'volume': rng.integers(1_000, 100_000, BARS)})
+
+    def intraday(self, symbol):
+        rng = _rng(symbol + ':tape')
+        n = int(rng.integers(50, 300))
+        last = self.bars(symbol)['close'].iloc[-1]
+        return pd.DataFrame({'time': pd.Timestamp(self.dates[-1]) + pd.to_timedelta(np.sort(rng.integers(0, 5*3600, n)), 's'),
+                             'price': np.round(last * np.exp(rng.normal(0, 0.01, n)), 2),
+                             'volume': rng.integers(1, 50, n) * 100, 'match_type': rng.choice(['Buy', 'Sell'], n)})
+
+    def board(self, symbols):
+        rows = [{'listing_symbol': s, 'listing_underlying_symbol': self.terms[s]['underlying'],
+                 'listing_exercise_price': self.terms[s]['strike'] * 1000,
+                 'listing_exercise_ratio': f"{self.terms[s]['ratio']}:1",
+                 'listing_maturity_date': self.terms[s]['maturity'].strftime('%Y-%m-%d')}
+                for s in symbols if s in self.terms]
+        return pd.DataFrame(rows)
+
+    def module(self):
+        """Module vnstock giả có Listing, Quote, Trading, Vnstock như các chỗ repo đang dùng."""
+        market = self
+        mod = types.ModuleType('vnstock')
+
+        class Listing:
+            def __init__(self, source=None):
+                pass
+
+            def all_covered_warrant(self):
+                market._sleep()
+                return pd.Series(market.symbols, name='symbol')
+
+        class Quote:
+            def __init__(self, symbol=None, source=None):
+                self.symbol = symbol
+
+            def history(self, start=None, end=None, **kwargs):
+                market._sleep()
+                df = market.bars(self.symbol)
+                return df[(df['time'] >= pd.Timestamp(start)) & (df['time'] <= pd.Timestamp(end))].reset_index(drop=True)
+
+            def intraday(self, **kwargs):
+                market._sleep()
+                return market.intraday(self.symbol)
+
+            def price_depth(self, **kwargs):
+                return pd.DataFrame()
+
+        class Trading:
+            def __init__(self, symbol=None, source=None):
+                pass
+
+            def price_board(self, symbols, **kwargs):
+                market._sleep()
+                return market.board(symbols)
+
+        class Vnstock:
+            def __init__(self, symbol=None, source=None):
+                self.symbol = symbol
+
+            def stock(self):
+                return types.SimpleNamespace(quote=types.SimpleNamespace(
+                    history=lambda **kw: pd.DataFrame({'close': [25_000.0]})))
+
+        mod.Listing, mod.Quote, mod.Trading, mod.Vnstock = Listing, Quote, Trading, Vnstock
+        return mod
+
+def rate(count, seconds):
+    return count / seconds if seconds > 0 else float('inf')
+
+def timeit(func, min_time=0.2):
+    """Số lần gọi/giây của func (gọi lặp tới khi đủ min_time giây)."""
+    n, start = 0, time.perf_counter()
+    while True:
+        func()
+        n += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return rate(n, elapsed)
+
+def bs_reference(S, K, sigma, r, T):
+    """Black-Scholes call viết lại bằng math.erf, độc lập với greeks.py."""
+    d1 = (math.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * math.sqrt(T))
+    d2 = d1 - sigma * math.sqrt(T)
+    N = lambda x: 0.5 * (1 + math.erf(x / math.sqrt(2)))
+    return S * N(d1) - K * math.exp(-r * T) * N(d2)
+
+def bench_pricing(results):
+    from analysis import monte_carlo_price, bs_delta
+    from greeks import bs_greeks
+    from montecarlo import mc_price
+    from dashboard_web import black_scholes_price
+    results['black_scholes_price.calls_per_s'] = timeit(lambda: black_scholes_price(25, 24, 0.3, 0.05, 0.25))
+    results['bs_delta.calls_per_s'] = timeit(lambda: bs_delta(25, 24, 0.3, 0.05, 0.25))
+    N = 20000
+    results['monte_carlo_price.paths_per_s'] = N * timeit(lambda: monte_carlo_price(25, 0.3, 0.05, 0.25, 24, N=N, seed=1))
+    rng = np.random.default_rng(0)
+    n = 100_000
+    S, K = rng.uniform(10, 50, n), rng.uniform(10, 50, n)
+    sig, T = rng.uniform(0.1, 0.8, n), rng.uniform(0.02, 2, n)
+    results['bs_greeks.options_per_s'] = n * timeit(lambda: bs_greeks(S, K, sig, 0.05, T))
+
+    # Độ chính xác: giá đóng so với bản viết lại độc lập, delta so với sai phân trung tâm
+    grid = [(S_, K_, s_, T_) for S_ in (10, 25, 40) for K_ in (20, 25, 30) for s_ in (0.15, 0.4, 0.8) for T_ in (0.05, 0.5, 2)]
+    S, K, sig, T = (np.array(x, dtype=float) for x in zip(*grid))
+    ref = np.array([bs_reference(*g[:3], 0.05, g[3]) for g in grid])
+    results['accuracy.bs_max_abs_err'] = float(max(abs(black_scholes_price(*g[:3], 0.05, g[3]) - ref[i])
+                                                   for i, g in enumerate(grid)))
+    h = 1e-4
+    fd = (bs_greeks(S + h, K, sig, 0.05, T)['price'] - bs_greeks(S - h, K, sig, 0.05, T)['price']) / (2 * h)
+    results['accuracy.delta_max_abs_err'] = float(np.max(np.abs(bs_delta(S, K, sig, 0.05, T) - fd)))
+    # Monte Carlo: sai lệch theo số sai số chuẩn và tương đối, chỉ trên các giá đáng kể. Quyền chọn
+    # sâu trong/ngoài tiền có sai số chuẩn gần 0 nhờ biến kiểm soát nên được chặn dưới theo giá.
+    mc = mc_price(S, K, sig, 0.05, T, N=200_000, seed=7)
+    big = ref > 0.05
+    err = np.abs(mc['price'] - ref)[big]
+    results['accuracy.mc_max_z'] = float(np.max(err / np.maximum(mc['std_error'][big], 1e-6 * ref[big])))
+    # Sai số tương đối chỉ có nghĩa khi giá đủ lớn so với sai số chuẩn (quyền chọn rẻ có thể lệch vài %)
+    results['accuracy.mc_max_rel_err'] = float(np.max((err / ref[big])[ref[big] > 0.5]))
+
+def _wait_job(dw, response, timeout=600):
+    job_id = response.headers['Location'].rstrip('/').split('/')[-2]
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        job = dw.jobs.get(job_id)
+        if job.status in ('done', 'error'):
+            if job.status == 'error':
+                raise RuntimeError(f'Tác vụ {job.kind} lỗi: {job.result}')
+            return job.result
+        time.sleep(0.01)
+    raise TimeoutError(job_id)
+
+def bench_routes(results, sizes, latency=0.0, fetch_rate=None):
+    import warrant_scraper, result_cache, history_store
+    import dashboard_web as dw
+    # Mặc định nhà cung cấp giả không giới hạn tốc độ; vẫn chạy qua fetch_many như thật
+    dw.FETCH_RATE = fetch_rate or 1e6
+    if fetch_rate:
+        results['fetch_rate'] = fetch_rate
+    client = dw.app.test_client()
+    cwd = os.getcwd()
+    for n in sizes:
+        market = FakeMarket(n, latency)
+        sys.modules['vnstock'] = market.module()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                for cache in warrant_scraper._caches.values():
+                    cache.clear()
+                result_cache.analyze_cache.clear()
+                history_store._default_store = None
+                for name, path in (('download', '/download'), ('download_trade', '/download_trade'),
+                                   ('analyze', '/analyze'), ('analyze_warm', '/analyze')):
+                    t = time.perf_counter()
+                    _wait_job(dw, client.post(path))
+                    elapsed = time.perf_counter() - t
+                    results[f'{name}.seconds[{n}]'] = elapsed
+                    results[f'{name}.symbols_per_s[{n}]'] = rate(n, elapsed)
+            finally:
+                os.chdir(cwd)
+                history_store._default_store = None
+    for name in ('download', 'download_trade', 'analyze', 'analyze_warm'):
+        results[f'{name}.symbols_per_s'] = min(results[f'{name}.symbols_per_s[{n}]'] for n in sizes)
+
+def check(results, baseline=None, tolerance=0.3):
+    """Danh sách lỗi: vượt ngưỡng tuyệt đối, hoặc kém hơn baseline quá tolerance."""
+    failures = []
+    for key, (kind, limit) in THRESHOLDS.items():
+        if key.startswith('download') and 'fetch_rate' in results:
+            limit = FETCH_RATE_FLOOR * results['fetch_rate']
+        if key not in results or limit is None:
+            continue
+        value = results[key]
+        if (kind == 'min' and value < limit) or (kind == 'max' and value > limit):
+            failures.append(f'{key} = {value:.4g} ({kind} {limit:.4g})')
+    for key, base in (baseline or {}).items():
+        if key not in results or key not in THRESHOLDS:
+            continue
+        kind = THRESHOLDS[key][0]
+        value = results[key]
+        if kind == 'min' and value < base * (1 - tolerance):
+            failures.append(f'{key} = {value:.4g} giảm hơn {tolerance:.0%} so với baseline {base:.4g}')
+        if kind == 'max' and value > base * (1 + tolerance) and value > (THRESHOLDS[key][1] or 0) * 0.1:
+            failures.append(f'{key} = {value:.4g} tăng hơn {tolerance:.0%} so với baseline {base:.4g}')
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Đo hiệu năng định giá và các route với dữ liệu giả lập offline')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200], help='số mã chứng quyền của mỗi lượt đo route')
+    parser.add_argument('--latency', type=float, default=0.0, help='độ trễ giả lập mỗi lần gọi nhà cung cấp (giây)')
+    parser.add_argument('--fetch-rate', type=float, help='giới hạn yêu cầu/giây của token bucket khi đo route; '
+                        f'có thì /download phải đạt ít nhất {FETCH_RATE_FLOOR:.0%} tốc độ này')
+    parser.add_argument('--skip-routes', action='store_true')
+    parser.add_argument('--json', help='ghi kết quả ra file JSON (dùng làm baseline)')
+    parser.add_argument('--baseline', help='file JSON kết quả lần trước để so sánh')
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    args = parser.parse_args(argv)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    bench_pricing(results)
+    if not args.skip_routes:
+        bench_routes(results, args.sizes, args.latency, args.fetch_rate)
+    for key, value in results.items():
+        print(f'{key:<40} {value:>14.4g}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = check(results, baseline, args.tolerance)
+    for failure in failures:
+        print('FAIL', failure, file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+# charts.py
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import metrics
+from warrant_scraper import TTLCache
+
+@metrics.timed('render', chart='bar')
+def render_bar_png(labels, values, title='', ylabel='', color='green'):
+    """Vẽ biểu đồ cột ra PNG bằng Figure/Agg hướng đối tượng (không dùng trạng thái toàn cục của pyplot)."""
+    # matplotlib chỉ import khi vẽ ảnh đầu tiên, không làm chậm khởi động
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(8, 4))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.bar(range(len(values)), values, color=color)
+    ax.set_xticks(range(len(labels)))
+    ax.set_xticklabels(labels, rotation=90)
+    ax.set_title(title)
+    ax.set_ylabel(ylabel)
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+class ChartService:
+    """Vẽ biểu đồ trên luồng nền, cache ảnh theo băm nội dung.
+
+    submit() trả về ngay mã ảnh (chart_id); get() chờ ảnh vẽ xong. Dữ liệu vẽ được giữ lại
+    để vẽ lại nếu ảnh đã bị đẩy khỏi cache.
+    """
+
+    def __init__(self, max_workers=1, maxsize=64):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.images = TTLCache(ttl=float('inf'), maxsize=maxsize)
+        self.specs = TTLCache(ttl=float('inf'), maxsize=maxsize*8)
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def submit(self, labels, values, title='', ylabel='', color='green'):
+        spec = {'labels': [str(x) for x in labels], 'values': [float(v) for v in values],
+                'title': title, 'ylabel': ylabel, 'color': color}
+        chart_id = hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:32]
+        self.specs.set(chart_id, spec)
+        self._schedule(chart_id, spec)
+        return chart_id
+
+    def _schedule(self, chart_id, spec):
+        with self.lock:
+            if chart_id in self.pending or self.images.get(chart_id)[0]:
+                return self.pending.get(chart_id)
+            future = self.pending[chart_id] = self.executor.submit(self._render, chart_id, spec)
+            return future
+
+    def _render(self, chart_id, spec):
+        try:
+            png = render_bar_png(**spec)
+            self.images.set(chart_id, png)
+            return png
+        finally:
+            with self.lock:
+                self.pending.pop(chart_id, None)
+
+    def get(self, chart_id, timeout=30):
+        """Ảnh PNG của chart_id (chờ tối đa timeout giây nếu đang vẽ), None nếu không biết mã này."""
+        found, png = self.images.get(chart_id)
+        if found:
+            return png
+        found, spec = self.specs.get(chart_id)
+        if not found:
+            return None
+        future = self._schedule(chart_id, spec)
+        if future is None:
+            return self.images.get(chart_id)[1]
+        return future.result(timeout=timeout)
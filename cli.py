@@ -0,0 +1,106 @@
+# cli.py
+"""Dòng lệnh: python cli.py {price,download,analyze,shap} ...
+
+Chỉ import các module nặng (pandas, scipy, Flask, vnstock, sklearn/shap) khi lệnh cần tới,
+và in ra stderr thời gian khởi động, từng lần import và thời gian chạy lệnh.
+"""
+import argparse
+import importlib
+import sys
+import time
+
+_t0 = time.perf_counter()
+# Thời gian CPU trình thông dịch đã dùng trước khi vào cli (khởi động Python + site)
+STARTUP_CPU = time.process_time()
+timings = []
+
+def timed_import(name):
+    """import_module có ghi lại thời gian (module đã nạp sẵn thì gần như bằng 0)."""
+    t = time.perf_counter()
+    module = importlib.import_module(name)
+    timings.append((f'import {name}', time.perf_counter() - t))
+    return module
+
+def cmd_price(args):
+    greeks = timed_import('greeks')
+    g = greeks.bs_greeks(args.S, args.K, args.sigma, args.r, args.T, args.type, ratio=args.ratio)
+    for name, value in g.items():
+        print(f'{name:>6}: {float(value):.6f}')
+    if args.mc:
+        montecarlo = timed_import('montecarlo')
+        res = montecarlo.mc_price(args.S, args.K, args.sigma, args.r, args.T, args.ratio, N=args.mc, seed=args.seed)
+        print(f'    mc: {float(res["price"]):.6f} ± {float(res["std_error"]):.6f}')
+
+def cmd_download(args):
+    dashboard_web = timed_import('dashboard_web')
+    print(dashboard_web.run_download_trade() if args.trade else dashboard_web.run_download())
+
+def cmd_analyze(args):
+    dashboard_web = timed_import('dashboard_web')
+    table, _ = dashboard_web.load_priced_table()
+    if table is None:
+        print('Chưa có dữ liệu, hãy chạy: python cli.py download', file=sys.stderr)
+        return 1
+    df = table[table['profit'] > 0].sort_values('profit', ascending=False)
+    df, summary = timed_import('portfolio').allocate(df, args.investment)
+    print(df.head(args.top).to_string(index=False))
+    print(f"Đầu tư {summary['invested']:,.0f} VNĐ, tiền mặt {summary['cash']:,.0f} VNĐ")
+
+def cmd_shap(args):
+    pd = timed_import('pandas')
+    shap_analysis = timed_import('shap_analysis')
+    res = shap_analysis.analyze_shap(pd.read_csv(args.csv), target=args.target, n_jobs=args.jobs,
+                                     budget=args.budget, by=args.by, background=args.background, out_dir=args.out)
+    print(res['importance'].to_string())
+    print(f"Đã giải thích {res['explained_rows']}/{res['total_rows']} dòng; lưu tại {args.out}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='Định giá và phân tích chứng quyền')
+    parser.add_argument('--no-timing', action='store_true', help='không in thời gian khởi động/import')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('price', help='giá Black-Scholes và các Greeks của một chứng quyền')
+    p.add_argument('--S', type=float, required=True, help='giá cổ phiếu cơ sở')
+    p.add_argument('--K', type=float, required=True, help='giá thực hiện')
+    p.add_argument('--sigma', type=float, default=0.3)
+    p.add_argument('--r', type=float, default=0.05)
+    p.add_argument('--T', type=float, default=30/252, help='thời gian đáo hạn (năm)')
+    p.add_argument('--ratio', type=float, default=1.0, help='tỷ lệ chuyển đổi')
+    p.add_argument('--type', choices=['call', 'put'], default='call')
+    p.add_argument('--mc', type=int, default=0, metavar='N', help='định giá thêm bằng Monte Carlo với N đường')
+    p.add_argument('--seed', type=int, default=None)
+    p.set_defaults(func=cmd_price)
+
+    p = sub.add_parser('download', help='tải snapshot mới nhất của mọi chứng quyền')
+    p.add_argument('--trade', action='store_true', help='tải dữ liệu khớp lệnh trong ngày thay cho nến')
+    p.set_defaults(func=cmd_download)
+
+    p = sub.add_parser('analyze', help='định giá snapshot đã tải và phân bổ vốn theo Kelly')
+    p.add_argument('--investment', type=float, default=10_000_000)
+    p.add_argument('--top', type=int, default=20)
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser('shap', help='giải thích mô hình giá bằng SHAP trên file CSV')
+    p.add_argument('csv', help='file CSV có cột warrant_price và các đặc trưng')
+    p.add_argument('--target', default='warrant_price')
+    p.add_argument('--budget', type=int, default=2000, help='số dòng tối đa được giải thích')
+    p.add_argument('--by', default=None, help='cột dùng để phân tầng mẫu (vd. underlying)')
+    p.add_argument('--background', type=int, default=None, help='số dòng nền cho explainer interventional')
+    p.add_argument('--jobs', type=int, default=-1, help='số lõi huấn luyện (-1: tất cả)')
+    p.add_argument('--out', default='data/shap')
+    p.set_defaults(func=cmd_shap)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    t = time.perf_counter()
+    code = args.func(args)
+    run = time.perf_counter() - t - sum(s for name, s in timings if name.startswith('import '))
+    if not args.no_timing:
+        parts = [f'startup {STARTUP_CPU:.3f}s (CPU)'] + [f'{name} {s:.3f}s' for name, s in timings]
+        parts += [f'run {run:.3f}s', f'total {time.perf_counter() - _t0:.3f}s']
+        print(' | '.join(parts), file=sys.stderr)
+    return code or 0
+
+if __name__ == '__main__':
+    sys.exit(main())
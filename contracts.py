@@ -0,0 +1,105 @@
+# contracts.py
+import logging
+import os
+import re
+import numpy as np, pandas as pd
+import metrics
+from fetch_pipeline import fetch_many
+from warrant_store import underlying_of
+from realized_vol import latest_quotes
+
+# Điều khoản chứng quyền (mã cơ sở, giá thực hiện, tỷ lệ chuyển đổi, ngày đáo hạn) không đổi trong
+# suốt vòng đời nên được lưu lại; có thể sửa tay file này để bổ sung mã mà nguồn dữ liệu thiếu.
+CONTRACTS_CSV = 'warrant_contracts.csv'
+CONTRACT_COLUMNS = ['symbol', 'underlying', 'strike', 'ratio', 'maturity_date']
+# Tên cột trên bảng giá VCI (đã làm phẳng) tương ứng từng điều khoản
+BOARD_FIELDS = {'underlying': 'underlying_symbol', 'strike': 'exercise_price',
+                'ratio': 'exercise_ratio', 'maturity_date': 'maturity_date'}
+
+def parse_ratio(value):
+    """Tỷ lệ chuyển đổi dạng '4:1', '4.0' hoặc số -> số chứng quyền cho 1 cổ phiếu."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return np.nan
+    m = re.fullmatch(r'\s*([\d.]+)\s*:\s*([\d.]+)\s*', str(value))
+    if m:
+        return float(m.group(1)) / float(m.group(2))
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+def fetch_contracts(symbols, batch_size=50):
+    """Lấy điều khoản của các chứng quyền từ bảng giá VCI, mỗi lần một lô mã."""
+    from vnstock import Trading
+    frames = []
+    for i in range(0, len(symbols), batch_size):
+        batch = [str(s).upper() for s in symbols[i:i + batch_size]]
+        board = Trading(source="VCI", symbol=batch[0]).price_board(batch, flatten_columns=True)
+        columns = {c.lower(): c for c in board.columns}
+        symbol_col = next((columns[c] for c in ('listing_symbol', 'symbol') if c in columns), None)
+        out = pd.DataFrame({'symbol': board[symbol_col] if symbol_col else batch[:len(board)]})
+        for field, name in BOARD_FIELDS.items():
+            col = next((columns[c] for c in (f'listing_{name}', name) if c in columns), None)
+            out[field] = board[col].to_numpy() if col else np.nan
+        frames.append(out)
+    contracts = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=CONTRACT_COLUMNS)
+    return normalize_contracts(contracts)
+
+def normalize_contracts(contracts):
+    contracts = contracts.reindex(columns=CONTRACT_COLUMNS).copy()
+    contracts['symbol'] = contracts['symbol'].astype(str).str.upper()
+    # Thiếu mã cơ sở thì suy từ mã chứng quyền (CACB2404 -> ACB)
+    contracts['underlying'] = contracts['underlying'].where(contracts['underlying'].notna(),
+                                                            contracts['symbol'].map(underlying_of))
+    contracts['strike'] = pd.to_numeric(contracts['strike'], errors='coerce')
+    contracts['ratio'] = contracts['ratio'].map(parse_ratio)
+    contracts['maturity_date'] = pd.to_datetime(contracts['maturity_date'], errors='coerce').dt.strftime('%Y-%m-%d')
+    return contracts
+
+def load_contracts(symbols, path=CONTRACTS_CSV, fetch=fetch_contracts):
+    """Điều khoản của các mã: đọc từ file đã lưu, chỉ tải các mã chưa có đủ thông tin rồi lưu lại."""
+    symbols = [str(s).upper() for s in symbols]
+    cached = normalize_contracts(pd.read_csv(path)) if os.path.exists(path) else pd.DataFrame(columns=CONTRACT_COLUMNS)
+    complete = cached.dropna(subset=['strike', 'ratio', 'maturity_date'])
+    missing = [s for s in symbols if s not in set(complete['symbol'])]
+    if missing:
+        try:
+            fetched = fetch(missing)
+            kept = cached[~cached['symbol'].isin(fetched['symbol'])]
+            cached = pd.concat([kept, fetched], ignore_index=True) if len(kept) else fetched
+            cached.to_csv(path, index=False)
+        except Exception as e:
+            logging.warning("Không tải được điều khoản chứng quyền: %s", e)
+            metrics.count_error('contracts', e, step='fetch')
+    out = pd.DataFrame({'symbol': symbols}).merge(cached.drop_duplicates('symbol', keep='last'), on='symbol', how='left')
+    out['underlying'] = out['underlying'].fillna(out['symbol'].map(underlying_of))
+    return out
+
+def underlying_quotes(underlyings, fetch, **fetch_kwargs):
+    """Giá đóng cửa và sigma năm hóa của từng mã cơ sở; mỗi mã cơ sở chỉ tải một lần."""
+    underlyings = sorted({u for u in underlyings if isinstance(u, str) and u != 'UNKNOWN'})
+    histories, _ = fetch_many(fetch, underlyings, **fetch_kwargs)
+    quotes = latest_quotes({u: histories.get(u) for u in underlyings})
+    return quotes.rename(columns={'symbol': 'underlying', 'close': 'underlying_close', 'sigma': 'underlying_sigma'})
+
+def attach_contracts(df, fetch, **fetch_kwargs):
+    """Ghép điều khoản và giá/sigma mã cơ sở vào bảng snapshot (symbol, close, sigma).
+
+    Lỗi khi lấy điều khoản hay giá cơ sở không làm hỏng snapshot: bảng được trả về như cũ và
+    các mã đó vẫn được định giá theo cách cũ.
+    """
+    if len(df) == 0:
+        return df
+    try:
+        contracts = load_contracts(df['symbol'])
+        quotes = underlying_quotes(contracts['underlying'], fetch, **fetch_kwargs)
+    except Exception as e:
+        logging.warning("Không ghép được điều khoản chứng quyền: %s", e)
+        metrics.count_error('contracts', e, step='attach')
+        return df
+    out = df.assign(symbol=df['symbol'].astype(str).str.upper())
+    out = out.merge(contracts, on='symbol', how='left').merge(quotes, on='underlying', how='left')
+    # Giá thực hiện trên bảng giá tính bằng đồng, giá lịch sử tính bằng nghìn đồng
+    scale = np.where(out['strike'] > 100 * out['underlying_close'], 1000.0, 1.0)
+    out['strike'] = out['strike'] / scale
+    return out
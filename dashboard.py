@@ -1,46 +1,25 @@
 # dashboard.py
-import pandas as pd
-from warrant_scraper import get_all_warrants, get_warrant_history, fetch_fx_rate
-from analysis import monte_carlo_price, bs_delta, kelly_fraction
+from warrant_scraper import listing_symbols, get_warrant_history, fetch_fx_rate
+from analysis import price_table
+from fetch_pipeline import fetch_many
+from contracts import attach_contracts
+from realized_vol import latest_quotes
+from portfolio import allocate
 
 
-def analyze_warrants(investment):
-    warrants = get_all_warrants()
-    results = []
+def analyze_warrants(investment, seed=None):
     fx_rate = fetch_fx_rate('USD', 'VND')
-    for idx, row in warrants.iterrows():
-        symbol = row['symbol']
-        try:
-            hist = get_warrant_history(symbol)
-            if len(hist) < 30:
-                continue
-            S0 = hist['close'].iloc[-1]
-            sigma = hist['close'].pct_change().std() * (252 ** 0.5)
-            r = 0.05
-            T = 30/252
-            K = S0
-            model_price = monte_carlo_price(S0, sigma, r, T, K)
-            market_price = S0
-            delta = bs_delta(S0, K, sigma, r, T)
-            edge = abs(market_price - model_price) / market_price
-            Kelly = kelly_fraction(edge, 0.55, 0.45, payoff_ratio=1)
-            action = "LONG" if model_price > market_price else "SHORT"
-            profit = model_price - market_price
-            results.append({
-                'symbol': symbol,
-                'market_price': market_price,
-                'model_price': model_price,
-                'delta': delta,
-                'kelly': Kelly,
-                'action': action,
-                'profit': profit
-            })
-        except Exception as e:
-            continue
-    df = pd.DataFrame(results)
+    # Listing trả về Series mã chứng quyền, không phải bảng có cột symbol
+    symbols = listing_symbols()
+    histories, _ = fetch_many(get_warrant_history, symbols)
+    # Giá cuối và sigma của mọi mã tính một lượt trên bảng rộng ngày x mã
+    rows = latest_quotes({s: histories.get(s) for s in symbols})
+    # Ghép điều khoản hợp đồng và giá mã cơ sở (mỗi mã cơ sở tải một lần), rồi định giá trong một lượt
+    df = attach_contracts(rows, get_warrant_history)
+    df = price_table(df, r=0.05, T=30/252, seed=seed)
     df = df[df['profit'] > 0].sort_values('profit', ascending=False)
-    # Phân bổ vốn theo Kelly
-    df['capital'] = (df['kelly'] / df['kelly'].sum()) * investment
+    # Phân bổ vốn theo Kelly có giới hạn tỷ trọng, lô và tiền mặt
+    df, _ = allocate(df, investment)
     return df
 
 
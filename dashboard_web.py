@@ -1,22 +1,61 @@
-from flask import Flask, render_template_string, request
+from flask import Flask, render_template_string, request, jsonify, redirect, Response, g
 import pandas as pd
-from warrant_scraper import get_all_warrants, get_warrant_history, get_warrant_intraday
-from analysis import monte_carlo_price, bs_delta, kelly_fraction
+from warrant_scraper import get_all_warrants, get_warrant_history, get_warrant_intraday, cache_stats, TTLCache
+from fetch_pipeline import fetch_many
+from warrant_store import SNAPSHOT_DIR, TRADE_DIR, TRADE_STATS_DIR, read_table, write_table, underlying_of
+from trade_stats import compute_trade_stats, update_trade_stats, STATS_COLUMNS
+from jobs import JobManager
+from result_cache import analyze_cache, content_key
+from charts import ChartService
+from analysis import monte_carlo_price, bs_delta, kelly_fraction, price_table, with_market_prices, CONTRACT_INPUTS
+from contracts import attach_contracts
+from realized_vol import latest_quotes
+from portfolio import allocate
+from implied_vol import IVSurface
+from api_client import ssi_warrant_price, market_quotes
+import metrics
 import logging
 import os
-import matplotlib.pyplot as plt
 import base64
-from io import BytesIO
+import json
 import time
 from datetime import datetime
-from scipy.stats import norm
+from greeks import bs_greeks
 
 logging.getLogger('vnstock').setLevel(logging.ERROR)
 
 app = Flask(__name__)
+charts = ChartService()
 
+# Dữ liệu lưu dạng Parquet phân vùng theo ngày/mã cơ sở (warrant_store); CSV cũ chỉ còn để đọc lại
 DATA_CSV = 'warrant_data.csv'
 TRADE_CSV = 'warrant_trade_data.csv'
+TRADE_STATS_CSV = 'warrant_trade_stats.csv'
+# Seed cố định để các lần phân tích trên cùng dữ liệu cho cùng giá mô hình và phân bổ Kelly
+MC_SEED = 20240101
+# Tải song song FETCH_WORKERS luồng, tối đa FETCH_RATE yêu cầu/giây tới vnstock
+FETCH_WORKERS = 4
+FETCH_RATE = 2.0
+# Tham số định giá của nút Phân tích (cũng là một phần khóa cache kết quả)
+ANALYZE_R = 0.05
+ANALYZE_T = 30/252
+ANALYZE_N = 20000
+ANALYZE_INVESTMENT = 10000000
+iv_surface = IVSurface(r=ANALYZE_R)
+# Có khóa API SSI thì lấy giá thị trường trực tiếp thay cho giá đóng cửa
+SSI_QUOTES = bool(os.environ.get('SSI_API_KEY'))
+# Giá SSI của cả bảng được dùng lại trong SSI_QUOTES_TTL giây (các trang API không gọi lại SSI)
+SSI_QUOTES_TTL = 15
+ssi_quotes_cache = TTLCache(ttl=SSI_QUOTES_TTL, maxsize=4)
+
+def live_quotes(symbols):
+    """Giá SSI (symbol, market_price) của các mã, gọi song song qua SSIClient.quotes và cache ngắn hạn."""
+    key = tuple(sorted(str(s) for s in symbols))
+    found, quotes = ssi_quotes_cache.get(key)
+    if not found:
+        quotes = market_quotes(key)
+        ssi_quotes_cache.set(key, quotes)
+    return quotes
 
 def analyze_warrants(investment):
     # Lấy danh sách tất cả mã chứng quyền còn giao dịch trên thị trường (Series)
@@ -25,178 +64,384 @@ def analyze_warrants(investment):
         symbols = warrants.values
     else:
         symbols = list(warrants)
-    results = []
-    for symbol in symbols:
-        try:
-            hist = get_warrant_history(symbol)
-            if hist is None or len(hist) < 30 or 'close' not in hist:
-                continue
-            S0 = hist['close'].iloc[-1]
-            sigma = hist['close'].pct_change().std() * (252 ** 0.5)
-            r = 0.05
-            T = 30/252
-            K = S0
-            model_price = monte_carlo_price(S0, sigma, r, T, K)
-            market_price = S0
-            delta = bs_delta(S0, K, sigma, r, T)
-            edge = abs(market_price - model_price) / market_price
-            Kelly = kelly_fraction(edge, 0.55, 0.45, payoff_ratio=1)
-            action = "LONG" if model_price > market_price else "SHORT"
-            profit = model_price - market_price
-            results.append({
-                'symbol': symbol,
-                'market_price': market_price,
-                'model_price': model_price,
-                'delta': delta,
-                'kelly': Kelly,
-                'action': action,
-                'profit': profit
-            })
-        except Exception as e:
-            continue
-    df = pd.DataFrame(results)
+    histories, _ = fetch_many(get_warrant_history, symbols, max_workers=FETCH_WORKERS, rate=FETCH_RATE)
+    # Giá cuối và sigma của mọi mã tính một lượt trên bảng rộng ngày x mã
+    rows = latest_quotes({s: histories.get(s) for s in symbols})
+    # Ghép điều khoản hợp đồng và giá mã cơ sở (mỗi mã cơ sở tải một lần), rồi định giá trong một lượt
+    df = attach_contracts(rows, get_warrant_history, max_workers=FETCH_WORKERS, rate=FETCH_RATE)
+    df = price_table(df, r=0.05, T=30/252, seed=MC_SEED)
+    if SSI_QUOTES:
+        # Giá thị trường trực tiếp thay cho giá đóng cửa; mã SSI không trả giá giữ giá đóng cửa
+        df = with_market_prices(df, live_quotes(df['symbol']))
     df = df[df['profit'] > 0].sort_values('profit', ascending=False)
-    # Phân bổ vốn theo Kelly
-    if not df.empty:
-        df['capital'] = (df['kelly'] / df['kelly'].sum()) * investment
+    # Phân bổ vốn theo Kelly có giới hạn tỷ trọng, lô và tiền mặt
+    df, _ = allocate(df, investment)
     return df
 
-# Nút tải dữ liệu: lấy top 20 mã, lưu vào file CSV
-@app.route('/download', methods=['POST'])
-def download_data():
+# Nút tải dữ liệu: tải toàn bộ mã, lưu snapshot (chạy nền qua jobs)
+def run_download(job=None):
     warrants = get_all_warrants()
     # Lấy toàn bộ mã chứng quyền
     if hasattr(warrants, 'values'):
         symbols = warrants.values
     else:
         symbols = list(warrants)
-    results = []
-    import time
-    for symbol in symbols:
-        try:
-            hist = get_warrant_history(symbol)
-            if hist is None or len(hist) < 30 or 'close' not in hist:
-                continue
-            S0 = hist['close'].iloc[-1]
-            sigma = hist['close'].pct_change().std() * (252 ** 0.5)
-            results.append({'symbol': symbol, 'close': S0, 'sigma': sigma})
-            time.sleep(1)  # Thêm delay để tránh bị chặn API
-        except Exception as e:
-            continue
-    df = pd.DataFrame(results)
-    df.to_csv(DATA_CSV, index=False)
-    return f'Đã tải dữ liệu mới nhất ({len(df)} mã)! Quay lại để phân tích.'
+    if job is not None:
+        job.set_total(len(symbols))
+    # Tải song song, giới hạn tốc độ bằng token bucket thay cho sleep cố định mỗi mã
+    histories, status = fetch_many(get_warrant_history, symbols, max_workers=FETCH_WORKERS, rate=FETCH_RATE,
+                                   callback=job.advance if job is not None else None)
+    # Giá cuối và sigma của mọi mã tính một lượt trên bảng rộng ngày x mã
+    results = latest_quotes({s: histories.get(s) for s in symbols})
+    df = attach_contracts(results, get_warrant_history, max_workers=FETCH_WORKERS, rate=FETCH_RATE)
+    write_table(df, SNAPSHOT_DIR, legacy_csv=DATA_CSV)
+    # Snapshot mới: kết quả phân tích cũ không còn dùng được
+    analyze_cache.clear()
+    errors = sum(not st['ok'] for st in status.values())
+    return f'Đã tải dữ liệu mới nhất ({len(df)} mã, {errors} mã lỗi)! Quay lại để phân tích.'
 
-@app.route('/download_trade', methods=['POST'])
-def download_trade_data():
+def run_download_trade(job=None):
     warrants = get_all_warrants()
     if hasattr(warrants, 'values'):
         symbols = warrants.values
     else:
         symbols = list(warrants)
+    if job is not None:
+        job.set_total(len(symbols))
+    intradays, status = fetch_many(get_warrant_intraday, symbols, max_workers=FETCH_WORKERS, rate=FETCH_RATE,
+                                   callback=job.advance if job is not None else None)
     trade_results = []
-    import time
     for symbol in symbols:
-        try:
-            intraday = get_warrant_intraday(symbol)
-            if intraday is None or len(intraday) == 0:
-                continue
-            # Nếu intraday là DataFrame, thêm cột symbol để phân biệt
-            if hasattr(intraday, 'assign'):
-                intraday = intraday.assign(symbol=symbol)
-                trade_results.append(intraday)
-            time.sleep(1)  # Delay để tránh bị chặn API
-        except Exception as e:
+        intraday = intradays.get(symbol)
+        if intraday is None or len(intraday) == 0:
             continue
+        # Nếu intraday là DataFrame, thêm cột symbol để phân biệt
+        if hasattr(intraday, 'assign'):
+            trade_results.append(intraday.assign(symbol=symbol))
     if trade_results:
         df_trade = pd.concat(trade_results, ignore_index=True)
-        df_trade.to_csv(TRADE_CSV, index=False)
-        return f'Đã tải dữ liệu giao dịch ({len(df_trade)} dòng)! Quay lại để phân tích.'
+        write_table(df_trade, TRADE_DIR, legacy_csv=TRADE_CSV)
+        # Tính sẵn thống kê theo mã khi tải, để /analyze không phải quét lại băng lệnh; lần tải sau trong
+        # cùng ngày chỉ cộng thêm các lệnh mới vào thống kê đã lưu
+        today = datetime.today().strftime('%Y-%m-%d')
+        old = read_table(TRADE_STATS_DIR, columns=STATS_COLUMNS, date=today)
+        write_table(update_trade_stats(old, df_trade), TRADE_STATS_DIR, date=today, legacy_csv=TRADE_STATS_CSV)
+        analyze_cache.clear()
+        errors = sum(not st['ok'] for st in status.values())
+        return f'Đã tải dữ liệu giao dịch ({len(df_trade)} dòng, {errors} mã lỗi)! Quay lại để phân tích.'
     else:
         return 'Không có dữ liệu giao dịch nào được tải!'
 
-# Nút phân tích: đọc file CSV, phân tích, định giá, xuất kết quả và biểu đồ
-@app.route('/analyze', methods=['POST'])
-def analyze_data():
-    # Đọc dữ liệu cơ bản
-    if not os.path.exists(DATA_CSV):
+def load_priced_table():
+    """Bảng đã định giá (mọi mã, chưa lọc lợi nhuận) của snapshot mới nhất kèm khóa nội dung.
+
+    Trả về (None, None) nếu chưa có dữ liệu. Bảng được cache theo khóa nội dung trong analyze_cache.
+    Có SSI_API_KEY thì market_price là giá SSI (giá mô hình vẫn lấy từ cache), khóa gồm cả giá SSI.
+    """
+    # Đọc dữ liệu cơ bản (chỉ các cột cần cho định giá)
+    df = read_table(SNAPSHOT_DIR, columns=['symbol', 'close', 'sigma', 'underlying', *CONTRACT_INPUTS], legacy_csv=DATA_CSV)
+    if df is None:
+        return None, None
+    # Thống kê giao dịch đã tính sẵn; dữ liệu cũ chưa có thì tính từ băng lệnh trong một lượt groupby
+    trade_stats = read_table(TRADE_STATS_DIR, columns=['symbol', 'volume_sum', 'trade_count', 'last_trade_price', 'vwap'],
+                             symbols=df['symbol'], legacy_csv=TRADE_STATS_CSV)
+    if trade_stats is None:
+        trade_df = read_table(TRADE_DIR, columns=['symbol', 'volume', 'price'], symbols=df['symbol'],
+                              legacy_csv=TRADE_CSV)
+        if trade_df is not None:
+            trade_stats = compute_trade_stats(trade_df)[['symbol', 'volume_sum', 'trade_count', 'last_trade_price', 'vwap']]
+    # Cùng snapshot, cùng thống kê giao dịch và cùng tham số thì dùng lại kết quả đã tính
+    key = content_key([df, trade_stats], r=ANALYZE_R, T=ANALYZE_T, N=ANALYZE_N,
+                      investment=ANALYZE_INVESTMENT, seed=MC_SEED)
+    found, table = analyze_cache.get(('priced', key))
+    if not found:
+        # Định giá toàn bộ bảng trong một lượt NumPy
+        table = price_table(df, r=ANALYZE_R, T=ANALYZE_T, N=ANALYZE_N, seed=MC_SEED)
+        # Mã cơ sở theo điều khoản hợp đồng (cột underlying của snapshot), mẫu mã chỉ dùng khi thiếu
+        contract_und = df.drop_duplicates('symbol', keep='last').set_index('symbol')['underlying'].astype(object) \
+            if 'underlying' in df else pd.Series(dtype=object)
+        und = table['symbol'].map(contract_und)
+        table['underlying'] = und.where(und.notna() & (und != 'UNKNOWN'), table['symbol'].map(underlying_of))
+        # Sigma ngầm định từ giá thị trường (chỉ giải lại cho mã có giá/điều khoản thay đổi)
+        table = table.merge(iv_surface.update(df), on='symbol', how='left')
+        if trade_stats is not None and len(trade_stats) > 0:
+            table = table.merge(trade_stats, on='symbol', how='left')
+        analyze_cache.set(('priced', key), table)
+    if SSI_QUOTES:
+        quotes = live_quotes(table['symbol'])
+        table = with_market_prices(table, quotes)
+        key = content_key([quotes], base=key)
+    return table, key
+
+# Nút phân tích: đọc dữ liệu đã lưu, phân tích, định giá, xuất kết quả và biểu đồ
+def run_analyze(job=None):
+    table, key = load_priced_table()
+    if table is None:
         return 'Chưa có dữ liệu, hãy tải dữ liệu trước!'
-    df = pd.read_csv(DATA_CSV)
-    # Đọc dữ liệu giao dịch nếu có
-    trade_df = None
-    if os.path.exists(TRADE_CSV):
-        trade_df = pd.read_csv(TRADE_CSV)
-    results = []
-    for _, row in df.iterrows():
-        try:
-            S0 = row['close']
-            sigma = row['sigma']
-            r = 0.05
-            T = 30/252
-            K = S0
-            model_price = monte_carlo_price(S0, sigma, r, T, K)
-            market_price = S0
-            delta = bs_delta(S0, K, sigma, r, T)
-            edge = abs(market_price - model_price) / market_price
-            Kelly = kelly_fraction(edge, 0.55, 0.45, payoff_ratio=1)
-            action = "LONG" if model_price > market_price else "SHORT"
-            profit = model_price - market_price
-            # Thống kê giao dịch nếu có dữ liệu giao dịch
-            trade_stats = {}
-            if trade_df is not None:
-                trades = trade_df[trade_df['symbol'] == row['symbol']]
-                if not trades.empty:
-                    trade_stats['volume_sum'] = trades['volume'].sum() if 'volume' in trades else None
-                    trade_stats['trade_count'] = len(trades)
-                    trade_stats['last_trade_price'] = trades['price'].iloc[-1] if 'price' in trades else None
-            results.append({
-                'symbol': row['symbol'],
-                'market_price': market_price,
-                'model_price': model_price,
-                'delta': delta,
-                'kelly': Kelly,
-                'action': action,
-                'profit': profit,
-                **trade_stats
-            })
-        except Exception as e:
-            continue
-    df2 = pd.DataFrame(results)
-    df2 = df2[df2['profit'] > 0].sort_values('profit', ascending=False)
+    found, cached = analyze_cache.get(('analyze', key))
+    if not found:
+        cached = allocate_and_render(table)
+        analyze_cache.set(('analyze', key), cached)
+    df2, chart_id = cached['table'], cached['chart']
     if df2.empty:
         return '<h3>Không có chứng quyền nào có lợi nhuận dương để phân tích!</h3><br><a href="/">Quay lại</a>'
-    if not df2.empty:
-        df2['capital'] = (df2['kelly'] / df2['kelly'].sum()) * 10000000
-    # Vẽ biểu đồ
-    fig, ax = plt.subplots(figsize=(8,4))
-    df2.head(10).plot.bar(x='symbol', y='profit', ax=ax, color='green')
-    plt.title('Top 10 chứng quyền có lợi nhuận kỳ vọng cao nhất')
-    plt.ylabel('Lợi nhuận kỳ vọng')
-    plt.tight_layout()
-    buf = BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-    plt.close(fig)
-    # Hiển thị bảng và biểu đồ
+    # Hiển thị bảng và biểu đồ (ảnh phục vụ riêng qua /chart/<id>.png)
     table_html = df2.to_html(index=False, float_format='{:,.2f}'.format)
     html = f"""
     <h3>Kết quả phân tích chứng quyền</h3>
-    <img src='data:image/png;base64,{img_base64}'/><br>
+    <img src='/chart/{chart_id}.png'/><br>
     {table_html}
     <br><a href='/'>Quay lại</a>
     """
     return html
 
+def allocate_and_render(table):
+    """Lọc mã có lãi, phân bổ vốn theo Kelly và gửi biểu đồ đi vẽ nền."""
+    df2 = table.drop(columns='underlying')
+    df2 = df2[df2['profit'] > 0].sort_values('profit', ascending=False)
+    if df2.empty:
+        return {'table': df2, 'chart': None}
+    df2, _ = allocate(df2, ANALYZE_INVESTMENT)
+    top = df2.head(10)
+    chart_id = charts.submit(top['symbol'], top['profit'], title='Top 10 chứng quyền có lợi nhuận kỳ vọng cao nhất',
+                             ylabel='Lợi nhuận kỳ vọng')
+    return {'table': df2, 'chart': chart_id}
+
+# Đo thời gian mọi route; ?trace=1 hoặc header X-Trace: 1 (hay METRICS_TRACE=1 cho mọi yêu cầu) ghi thêm vết
+# từng bước của yêu cầu, trả mã vết qua header X-Trace-Id và tóm tắt qua Server-Timing
+@app.before_request
+def start_request():
+    g.t0 = time.perf_counter()
+    g.trace = None
+    if metrics.TRACE_ALL or request.args.get('trace') == '1' or request.headers.get('X-Trace') == '1':
+        g.trace = metrics.start_trace(f'{request.method} {request.path}')
+
+@app.after_request
+def finish_request(response):
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.observe('http_request_seconds', time.perf_counter() - g.get('t0', time.perf_counter()),
+                    route=route, method=request.method, status=response.status_code)
+    trace = g.get('trace')
+    if trace is not None:
+        metrics.finish_trace(trace)
+        response.headers['X-Trace-Id'] = trace.id
+        timing = ', '.join(f'{a["name"]};dur={a["total"] * 1000:.1f}' for a in trace.summary()[:10])
+        if timing:
+            response.headers['Server-Timing'] = timing
+    return response
+
+@metrics.registry.collector
+def cache_samples():
+    # Hit/miss đã được TTLCache đếm sẵn: chỉ đọc ra lúc xuất /metrics
+    stats = {**cache_stats(), 'analyze': analyze_cache.stats(), 'chart_png': charts.images.stats()}
+    for kind in ('hits', 'misses', 'evictions'):
+        for name, st in stats.items():
+            yield f'cache_{kind}_total', 'counter', {'cache': name}, st[kind]
+    for name, st in stats.items():
+        yield 'cache_size', 'gauge', {'cache': name}, st['size']
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/traces', methods=['GET'])
+def metrics_traces():
+    return jsonify([t.to_dict(spans=False) for t in metrics.recent_traces()])
+
+@app.route('/metrics/traces/<trace_id>', methods=['GET'])
+def metrics_trace(trace_id):
+    trace = metrics.get_trace(trace_id)
+    if trace is None:
+        return jsonify({'error': 'Không tìm thấy vết'}), 404
+    return jsonify(trace.to_dict())
+
+@app.route('/chart/<chart_id>.png', methods=['GET'])
+def chart_png(chart_id):
+    # Ảnh đánh địa chỉ theo nội dung nên không bao giờ đổi: cho trình duyệt cache lâu dài
+    if request.headers.get('If-None-Match', '').strip('"') == chart_id:
+        return Response(status=304, headers={'ETag': f'"{chart_id}"'})
+    png = charts.get(chart_id)
+    if png is None:
+        return 'Không tìm thấy biểu đồ!', 404
+    return Response(png, mimetype='image/png', headers={
+        'Cache-Control': 'public, max-age=31536000, immutable', 'ETag': f'"{chart_id}"'})
+
+# Các nút trên giao diện chạy nền: gửi tác vụ rồi chuyển tới trang theo dõi tiến độ
+JOB_KINDS = {'download': run_download, 'download_trade': run_download_trade, 'analyze': run_analyze}
+jobs = JobManager(max_workers=2)
+
+@app.route('/download', methods=['POST'])
+def download_data():
+    job, _ = jobs.submit('download', run_download)
+    return redirect(f'/jobs/{job.id}/view')
+
+@app.route('/download_trade', methods=['POST'])
+def download_trade_data():
+    job, _ = jobs.submit('download_trade', run_download_trade)
+    return redirect(f'/jobs/{job.id}/view')
+
+@app.route('/analyze', methods=['POST'])
+def analyze_data():
+    job, _ = jobs.submit('analyze', run_analyze)
+    return redirect(f'/jobs/{job.id}/view')
+
+@app.route('/jobs/<kind>', methods=['POST'])
+def submit_job(kind):
+    if kind not in JOB_KINDS:
+        return jsonify({'error': f'Không có loại tác vụ {kind}'}), 404
+    # Người dùng khác bấm cùng nút khi tác vụ đang chạy sẽ nhận lại job đang chạy đó
+    job, created = jobs.submit(kind, JOB_KINDS[kind])
+    return jsonify({**job.to_dict(), 'shared': not created}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Không tìm thấy tác vụ'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Không tìm thấy tác vụ'}), 404
+    if job.status == 'error':
+        return jsonify({**job.to_dict(), 'error': job.result}), 500
+    if job.status != 'done':
+        return jsonify(job.to_dict()), 202
+    return job.result
+
+@app.route('/jobs/<job_id>/view', methods=['GET'])
+def job_view(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return 'Không tìm thấy tác vụ!', 404
+    info = job.to_dict()
+    if info['status'] == 'done':
+        return job.result
+    if info['status'] == 'error':
+        return f'<p>Lỗi khi chạy tác vụ {info["kind"]}: {job.result}</p><br><a href="/">Quay lại</a>'
+    total = info['total'] if info['total'] is not None else '?'
+    return f'''
+    <html><head><meta http-equiv="refresh" content="2"></head>
+    <body>
+        <h3>Đang chạy {info["kind"]}: {info["done"]}/{total} mã, {len(info["errors"])} lỗi</h3>
+        {f'<a href="/metrics/traces/{info["trace"]}">Vết tác vụ</a><br>' if info['trace'] else ''}
+        <a href="/">Quay lại</a>
+    </body></html>
+    '''
+
+# API JSON cho công cụ nội bộ: phân trang theo con trỏ, sắp xếp/lọc phía máy chủ, xuất NDJSON dạng luồng
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+def filter_priced(table, args):
+    """Lọc và sắp xếp bảng đã định giá theo tham số truy vấn (profit, underlying, kelly, action, sort)."""
+    mask = pd.Series(True, index=table.index)
+    for column in ('profit', 'kelly'):
+        if args.get(f'min_{column}') is not None:
+            mask &= table[column] >= float(args[f'min_{column}'])
+        if args.get(f'max_{column}') is not None:
+            mask &= table[column] <= float(args[f'max_{column}'])
+    if args.get('underlying'):
+        mask &= table['underlying'].isin([u.strip().upper() for u in args['underlying'].split(',')])
+    if args.get('action'):
+        mask &= table['action'] == args['action'].upper()
+    sort = args.get('sort', 'profit')
+    if sort not in table.columns:
+        raise ValueError(f'Không sắp xếp được theo cột {sort}')
+    ascending = args.get('order', 'desc') == 'asc'
+    # Sắp xếp ổn định, hòa thì theo symbol, để con trỏ phân trang luôn trỏ đúng vị trí
+    return table[mask].sort_values([sort, 'symbol'], ascending=[ascending, True], kind='mergesort')
+
+def encode_cursor(key, offset):
+    return base64.urlsafe_b64encode(json.dumps({'k': key[:16], 'o': offset}).encode()).decode()
+
+def decode_cursor(cursor, key):
+    """Vị trí trong con trỏ; ValueError nếu con trỏ hỏng, LookupError nếu dữ liệu đã đổi."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        k, offset = data['k'], data['o']
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f'Con trỏ không hợp lệ: {cursor}') from e
+    if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+        raise ValueError(f'Con trỏ không hợp lệ: {cursor}')
+    if k != key[:16]:
+        raise LookupError('Dữ liệu đã được cập nhật, hãy tải lại từ trang đầu')
+    return offset
+
+def parse_limit(value):
+    """Số dòng mỗi trang: số nguyên ≥ 1, tối đa API_MAX_PAGE_SIZE."""
+    if value is None:
+        return API_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError(f'limit phải là số nguyên: {value}') from None
+    if limit < 1:
+        raise ValueError(f'limit phải ≥ 1: {limit}')
+    return min(limit, API_MAX_PAGE_SIZE)
+
+def records_json(df):
+    # to_json xử lý NaN và kiểu NumPy; trả về chuỗi JSON mảng bản ghi
+    return df.to_json(orient='records', force_ascii=False)
+
+@app.route('/api/warrants', methods=['GET'])
+def api_warrants():
+    table, key = load_priced_table()
+    if table is None:
+        return jsonify({'error': 'Chưa có dữ liệu, hãy tải dữ liệu trước!'}), 404
+    try:
+        rows = filter_priced(table, request.args)
+        offset = decode_cursor(request.args['cursor'], key) if request.args.get('cursor') else 0
+        limit = parse_limit(request.args.get('limit'))
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 410
+    except (ValueError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+    page = rows.iloc[offset:offset + limit]
+    next_cursor = encode_cursor(key, offset + limit) if offset + limit < len(rows) else None
+    body = f'{{"data": {records_json(page)}, "next_cursor": {json.dumps(next_cursor)}, "total": {len(rows)}}}'
+    return Response(body, mimetype='application/json')
+
+@app.route('/api/warrants/export', methods=['GET'])
+def api_warrants_export():
+    table, _ = load_priced_table()
+    if table is None:
+        return jsonify({'error': 'Chưa có dữ liệu, hãy tải dữ liệu trước!'}), 404
+    try:
+        rows = filter_priced(table, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate(chunk=500):
+        # Mỗi dòng một bản ghi JSON, gửi theo từng khối để không dựng cả kết quả trong bộ nhớ
+        for start in range(0, len(rows), chunk):
+            yield rows.iloc[start:start + chunk].to_json(orient='records', lines=True, force_ascii=False).rstrip('\n') + '\n'
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/api/warrants/<symbol>', methods=['GET'])
+def api_warrant(symbol):
+    table, _ = load_priced_table()
+    if table is None:
+        return jsonify({'error': 'Chưa có dữ liệu, hãy tải dữ liệu trước!'}), 404
+    row = table[table['symbol'] == symbol.upper()]
+    if row.empty:
+        return jsonify({'error': f'Không có mã {symbol.upper()}'}), 404
+    return Response(records_json(row)[1:-1], mimetype='application/json')
+
+@app.route('/api/iv/<underlying>', methods=['GET'])
+def api_iv_smile(underlying):
+    load_priced_table()
+    smile = iv_surface.smile(underlying.upper())
+    if smile.empty:
+        return jsonify({'error': f'Chưa có sigma ngầm định cho mã cơ sở {underlying.upper()}'}), 404
+    return Response(f'{{"underlying": {json.dumps(underlying.upper())}, "points": {records_json(smile)}}}',
+                    mimetype='application/json')
+
 def black_scholes_price(S, K, sigma, r=0.05, T=30/252, option_type='call'):
-    from numpy import log, sqrt, exp
-    d1 = (log(S/K) + (r + 0.5*sigma**2)*T) / (sigma*sqrt(T))
-    d2 = d1 - sigma*sqrt(T)
-    if option_type == 'call':
-        price = S * norm.cdf(d1) - K * exp(-r*T) * norm.cdf(d2)
-    else:
-        price = K * exp(-r*T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-    return float(price)
+    # Dùng chung d1/d2 với module greeks (tính được cả mảng qua greeks.bs_greeks)
+    return float(bs_greeks(S, K, sigma, r, T, option_type)['price'])
 
 # Giao diện chính với 2 nút
 HTML = '''
@@ -241,7 +486,8 @@ def dashboard():
         symbol = request.form.get('symbol', '').strip().upper()
         try:
             investment = float(request.form.get('investment', 10000000))
-        except Exception:
+        except Exception as e:
+            metrics.count_error('form', e, field='investment')
             investment = 10000000
         try:
             stock_price = float(request.form.get('stock_price', 0))
@@ -250,8 +496,8 @@ def dashboard():
             risk_free = float(request.form.get('risk_free', 4.5))
             sigma = float(request.form.get('sigma', 0.3))
             ratio = float(request.form.get('ratio', 1))
-        except Exception:
-            pass
+        except Exception as e:
+            metrics.count_error('form', e, field='pricing_inputs')
         try:
             # Tính thời gian đáo hạn thực tế (T, năm)
             if expiry_date:
@@ -279,18 +525,23 @@ def dashboard():
                 """
             else:
                 # Nếu không nhập đủ, lấy dữ liệu như cũ
-                hist = get_warrant_history(symbol)
-                if hist is None or len(hist) < 30 or 'close' not in hist:
+                quote = latest_quotes({symbol: get_warrant_history(symbol)})
+                if quote.empty or pd.isna(quote['sigma'].iloc[0]):
                     result_html = f"<p>Không đủ dữ liệu lịch sử cho mã {symbol}!</p>"
                 else:
-                    S0 = hist['close'].iloc[-1]
-                    sigma = hist['close'].pct_change().std() * (252 ** 0.5)
+                    S0, sigma = float(quote['close'].iloc[0]), float(quote['sigma'].iloc[0])
                     r = 0.05
                     T = 30/252
                     K = S0
-                    model_price_mc = monte_carlo_price(S0, sigma, r, T, K)
+                    model_price_mc = monte_carlo_price(S0, sigma, r, T, K, seed=MC_SEED, symbol=symbol)
                     model_price_bs = black_scholes_price(S0, K, sigma, r, T, option_type='call')
                     market_price = S0
+                    if SSI_QUOTES:
+                        try:
+                            market_price = ssi_warrant_price(symbol)
+                        except Exception as e:
+                            logging.warning("Không lấy được giá SSI của %s, dùng giá đóng cửa: %s", symbol, e)
+                            metrics.count_error('ssi_quote', e)
                     delta = bs_delta(S0, K, sigma, r, T)
                     edge = abs(market_price - model_price_mc) / market_price
                     Kelly = kelly_fraction(edge, 0.55, 0.45, payoff_ratio=1)
@@ -306,8 +557,9 @@ def dashboard():
                             trade_count = len(intraday)
                             last_price = intraday['price'].iloc[-1] if 'price' in intraday else 'N/A'
                             trade_stats = f"<li>Tổng khối lượng giao dịch: {vol_sum}</li><li>Số lệnh: {trade_count}</li><li>Giá khớp cuối: {last_price}</li>"
-                    except Exception:
-                        pass
+                    except Exception as e:
+                        logging.warning("Không lấy được dữ liệu giao dịch của %s: %s", symbol, e)
+                        metrics.count_error('intraday', e)
                     result_html = f"""
                     <h3>Kết quả phân tích mã {symbol}</h3>
                     <ul>
@@ -323,6 +575,7 @@ def dashboard():
                     </ul>
                     """
         except Exception as e:
+            metrics.count_error('dashboard', e)
             result_html = f"<p>Lỗi khi phân tích mã {symbol}: {e}</p>"
     html = f'''
     <!DOCTYPE html>
@@ -379,12 +632,14 @@ def show_data():
         if hist is not None and len(hist) > 0:
             hist_html = '<h4>Lịch sử giá (close 10 phiên gần nhất):</h4>' + hist.tail(10).to_html(index=False)
     except Exception as e:
+        metrics.count_error('show_data', e, part='history')
         hist_html = f'<p>Lỗi lấy lịch sử giá: {e}</p>'
     try:
         intraday = get_warrant_intraday(symbol)
         if intraday is not None and len(intraday) > 0:
             trade_html = '<h4>Giao dịch intraday (10 dòng cuối):</h4>' + intraday.tail(10).to_html(index=False)
     except Exception as e:
+        metrics.count_error('show_data', e, part='intraday')
         trade_html = f'<p>Lỗi lấy dữ liệu giao dịch: {e}</p>'
     html = f'''
     <!DOCTYPE html>
@@ -1,9 +1,9 @@
 # data_fetch.py
 import logging
 import pandas as pd
-from vnstock import stock_historical_data
 
 def fetch_stb():
+    from vnstock import stock_historical_data
     df = stock_historical_data("STB", start_date=None, end_date=None)
     df = df.tail(120).copy()
     df['ret'] = 100 * df['close'].pct_change()
@@ -11,11 +11,14 @@ def fetch_stb():
     logging.info("Data STB downloaded")
     return df
 
-def estimate_garch(df):
+def estimate_garch(df, starting_values=None):
+    """starting_values: tham số lần ước lượng trước (dict như vol_service.fit_garch) để khởi động nóng."""
     from arch import arch_model
+    from vol_service import PARAM_NAMES
     series = df['ret'].dropna()
     model = arch_model(series, vol='Garch', p=1, q=1)
-    res = model.fit(disp='off')
+    sv = [starting_values[name] for name in PARAM_NAMES] if starting_values else None
+    res = model.fit(disp='off', starting_values=sv)
     df['vol'] = res.conditional_volatility
     logging.info("GARCH fitted | sigma latest = %.4f", df['vol'].iloc[-1])
     return df
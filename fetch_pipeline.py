@@ -0,0 +1,78 @@
+# fetch_pipeline.py
+import contextvars
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+
+class RateLimiter:
+    """Token bucket dùng chung giữa các luồng: tối đa `rate` yêu cầu/giây, cho phép dồn `burst` yêu cầu."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def fetch_many(fetch, symbols, max_workers=4, rate=2.0, burst=None, retries=3, backoff=1.0, callback=None):
+    """Gọi fetch(symbol) cho nhiều mã song song, giới hạn tốc độ bằng token bucket.
+
+    Lỗi được thử lại tối đa `retries` lần với backoff lũy thừa (backoff, 2*backoff, ...) cộng nhiễu.
+    callback(symbol, status) được gọi khi mỗi mã xong. Trả về (results, status): results là
+    dict mã -> dữ liệu của các mã thành công, status là dict mã -> {'ok', 'attempts', 'error', 'elapsed'}.
+    Thời gian chờ token bucket, chờ backoff, số lần thử lại và số mã lỗi được ghi vào metrics theo tên hàm fetch.
+    """
+    name = getattr(fetch, '__name__', 'fetch')
+    limiter = RateLimiter(rate, burst)
+    results, status = {}, {}
+    lock = threading.Lock()
+
+    def run(symbol):
+        start = time.monotonic()
+        error = None
+        for attempt in range(1, retries + 2):
+            with metrics.timer('rate_limit_wait', fetch=name):
+                limiter.acquire()
+            try:
+                data = fetch(symbol)
+            except Exception as e:
+                error = e
+                if attempt <= retries:
+                    metrics.inc('fetch_retries_total', fetch=name)
+                    with metrics.timer('fetch_backoff', fetch=name):
+                        time.sleep(backoff * 2 ** (attempt - 1) + random.uniform(0, backoff))
+                continue
+            st = {'ok': True, 'attempts': attempt, 'error': None, 'elapsed': time.monotonic() - start}
+            with lock:
+                results[symbol] = data
+                status[symbol] = st
+            break
+        else:
+            logging.warning("Lỗi tải %s sau %d lần: %s", symbol, attempt, error)
+            metrics.count_error('fetch', error, fetch=name)
+            st = {'ok': False, 'attempts': attempt, 'error': str(error), 'elapsed': time.monotonic() - start}
+            with lock:
+                status[symbol] = st
+        if callback is not None:
+            callback(symbol, st)
+
+    # Mỗi luồng chạy trong bản sao ngữ cảnh của người gọi để span ghi vào đúng vết đang mở
+    with metrics.timer('fetch_many', fetch=name), ThreadPoolExecutor(max_workers=max_workers) as ex:
+        for f in [ex.submit(contextvars.copy_context().run, run, s) for s in symbols]:
+            f.result()
+    return results, status
@@ -0,0 +1,53 @@
+# greeks.py
+import numpy as np
+from scipy.special import ndtr
+
+SQRT_2PI = np.sqrt(2*np.pi)
+
+def d1_d2(S, K, sigma, r=0.05, T=30/252):
+    """Tính d1, d2 của Black-Scholes cho số hoặc mảng (float64)."""
+    S, K, sigma, r, T = (np.asarray(x, dtype=float) for x in (S, K, sigma, r, T))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vol_sqrt_T = sigma*np.sqrt(T)
+        d1 = (np.log(S/K) + (r + 0.5*sigma**2)*T) / vol_sqrt_T
+    return d1, d1 - vol_sqrt_T
+
+def bs_greeks(S, K, sigma, r=0.05, T=30/252, option_type='call', ratio=1):
+    """Giá và các Greeks (delta, gamma, vega, theta, rho) từ một lần tính d1/d2.
+
+    Nhận số hoặc mảng; giá và Greeks được chia cho tỷ lệ chuyển đổi ratio.
+    vega/rho tính cho 1 đơn vị sigma/r (không phải 1%), theta tính theo năm.
+    """
+    S, K, sigma, r, T, ratio = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (S, K, sigma, r, T, ratio)))
+    d1, d2 = d1_d2(S, K, sigma, r, T)
+    sqrt_T = np.sqrt(T)
+    disc = np.exp(-r*T)
+    pdf_d1 = np.exp(-0.5*d1**2) / SQRT_2PI
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gamma = pdf_d1 / (S*sigma*sqrt_T)
+        decay = -S*pdf_d1*sigma / (2*sqrt_T)
+    vega = S*pdf_d1*sqrt_T
+    if option_type == 'call':
+        Nd1, Nd2 = ndtr(d1), ndtr(d2)
+        price = S*Nd1 - K*disc*Nd2
+        delta = Nd1
+        theta = decay - r*K*disc*Nd2
+        rho = K*T*disc*Nd2
+    else:
+        Nd1, Nd2 = ndtr(-d1), ndtr(-d2)
+        price = K*disc*Nd2 - S*Nd1
+        delta = -Nd1
+        theta = decay + r*K*disc*Nd2
+        rho = -K*T*disc*Nd2
+    return {"price": price/ratio, "delta": delta/ratio, "gamma": gamma/ratio,
+            "vega": vega/ratio, "theta": theta/ratio, "rho": rho/ratio}
+
+def greeks_table(df, r=0.05, T=30/252, option_type='call'):
+    """Bảng độ nhạy cho cả danh sách (cột symbol, close, sigma; tùy chọn strike, T, ratio)."""
+    import pandas as pd
+    S = df['close'].to_numpy(dtype=float)
+    K = df['strike'].to_numpy(dtype=float) if 'strike' in df else S
+    T = df['T'].to_numpy(dtype=float) if 'T' in df else T
+    ratio = df['ratio'].to_numpy(dtype=float) if 'ratio' in df else 1
+    res = bs_greeks(S, K, df['sigma'].to_numpy(dtype=float), r, T, option_type, ratio)
+    return pd.DataFrame({'symbol': df['symbol'].to_numpy(), **res})
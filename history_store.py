@@ -0,0 +1,133 @@
+# history_store.py
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+import metrics
+
+HISTORY_DB = 'warrant_history.db'
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+class HistoryStore:
+    """Kho nến ngày theo từng mã trên SQLite: chỉ tải phần còn thiếu rồi ghi nối, đọc trực tiếp từ đĩa."""
+
+    def __init__(self, path=HISTORY_DB, max_age=15*60):
+        self.path = path
+        # Không gọi lại API nếu mã vừa đồng bộ trong vòng max_age giây
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        with self._connect() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("""CREATE TABLE IF NOT EXISTS bars (
+                symbol TEXT, time TEXT, open REAL, high REAL, low REAL, close REAL, volume REAL,
+                PRIMARY KEY (symbol, time))""")
+            con.execute("""CREATE TABLE IF NOT EXISTS meta (
+                symbol TEXT PRIMARY KEY, covered_from TEXT, last_date TEXT, synced_at REAL)""")
+
+    @contextmanager
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def meta(self, symbol):
+        with self._connect() as con:
+            row = con.execute("SELECT covered_from, last_date, synced_at FROM meta WHERE symbol=?", (symbol,)).fetchone()
+        return row
+
+    def last_date(self, symbol):
+        row = self.meta(symbol)
+        return row[1] if row else None
+
+    def read(self, symbol, start=None, end=None, columns=None):
+        """Đọc nến đã lưu của một mã (cột time kiểu datetime như vnstock)."""
+        cols = ['time'] + (columns or BAR_COLUMNS)
+        sql = f"SELECT {', '.join(cols)} FROM bars WHERE symbol=?"
+        params = [symbol]
+        if start is not None:
+            sql += " AND time>=?"; params.append(start)
+        if end is not None:
+            sql += " AND time<=?"; params.append(end)
+        with self._connect() as con:
+            df = pd.read_sql_query(sql + " ORDER BY time", con, params=params)
+        df['time'] = pd.to_datetime(df['time'])
+        return df
+
+    def read_all(self, symbols=None, start=None, end=None, columns=None):
+        """Đọc nến của nhiều mã (mặc định mọi mã trong kho) trong một truy vấn, dạng bảng dài có cột symbol."""
+        cols = ['symbol', 'time'] + (columns or BAR_COLUMNS)
+        sql = f"SELECT {', '.join(cols)} FROM bars WHERE 1=1"
+        params = []
+        if symbols is not None:
+            symbols = list(symbols)
+            sql += f" AND symbol IN ({', '.join('?' * len(symbols))})"; params += symbols
+        if start is not None:
+            sql += " AND time>=?"; params.append(start)
+        if end is not None:
+            sql += " AND time<=?"; params.append(end)
+        with self._connect() as con:
+            df = pd.read_sql_query(sql + " ORDER BY symbol, time", con, params=params)
+        df['time'] = pd.to_datetime(df['time'])
+        return df
+
+    def append(self, symbol, df, covered_from=None):
+        """Ghi nối (ghi đè theo ngày) các nến mới của một mã và cập nhật mốc đã lưu.
+
+        covered_from là ngày bắt đầu của khoảng đã tải, để lần sau không tải lại phần trước
+        ngày niêm yết (khi không có nến nào).
+        """
+        if df is not None and len(df) > 0:
+            bars = pd.DataFrame({'time': pd.to_datetime(df['time']).dt.strftime('%Y-%m-%d')})
+            for col in BAR_COLUMNS:
+                bars[col] = df[col].to_numpy() if col in df else None
+            rows = [(symbol, *rec) for rec in bars.itertuples(index=False, name=None)]
+            last = bars['time'].max()
+            covered_from = min(covered_from or last, bars['time'].min())
+        else:
+            rows, last = [], None
+        with self.lock, self._connect() as con:
+            con.executemany("INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            con.execute("""INSERT INTO meta VALUES (?, ?, ?, ?) ON CONFLICT(symbol) DO UPDATE SET
+                covered_from=CASE WHEN excluded.covered_from IS NOT NULL AND (covered_from IS NULL OR excluded.covered_from<covered_from) THEN excluded.covered_from ELSE covered_from END,
+                last_date=CASE WHEN excluded.last_date IS NOT NULL AND (last_date IS NULL OR excluded.last_date>last_date) THEN excluded.last_date ELSE last_date END,
+                synced_at=excluded.synced_at""", (symbol, covered_from, last, time.time()))
+
+    def update(self, symbol, fetch, start, end):
+        """Tải các đoạn [start, end] còn thiếu bằng fetch(symbol, start, end) rồi trả về dữ liệu đọc từ kho."""
+        meta = self.meta(symbol)
+        fresh = meta is not None and meta[2] is not None and time.time() - meta[2] < self.max_age
+        ranges = []
+        if meta is None or meta[0] is None:
+            ranges.append((start, end))
+        else:
+            covered_from, last = meta[0], meta[1] or meta[0]
+            if start < covered_from:
+                ranges.append((start, covered_from))
+            # Nến ngày cuối có thể chưa chốt, nên tải lại từ chính ngày đó
+            if last <= end and not fresh:
+                ranges.append((last, end))
+        for lo, hi in ranges:
+            try:
+                self.append(symbol, fetch(symbol, lo, hi), covered_from=lo)
+            except Exception as e:
+                if meta is None or meta[0] is None:
+                    raise
+                logging.warning("Không cập nhật được %s (%s → %s), dùng dữ liệu đã lưu: %s", symbol, lo, hi, e)
+                metrics.count_error('history_update', e)
+        return self.read(symbol, start, end)
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def default_store():
+    """Kho dùng chung của tiến trình (tạo lần đầu khi cần)."""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = HistoryStore()
+    return _default_store
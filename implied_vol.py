@@ -0,0 +1,96 @@
+# implied_vol.py
+import threading
+import numpy as np, pandas as pd
+from greeks import bs_greeks, d1_d2
+from analysis import time_to_maturity
+
+def implied_vol(price, S, K, r=0.05, T=30/252, ratio=1, option_type='call', tol=1e-8, max_iter=50, lo=1e-4, hi=5.0):
+    """Giải sigma ngầm định cho cả mảng chứng quyền cùng lúc.
+
+    Mỗi vòng dùng bước Halley (Newton bậc hai theo vega/volga) cho mọi mã chưa hội tụ; bước nào
+    nhảy ra ngoài khoảng kẹp [lo, hi] hoặc vega quá nhỏ thì chia đôi khoảng kẹp. price là giá
+    chứng quyền (đã chia tỷ lệ chuyển đổi ratio). Trả về (iv, converged); mã có giá nằm ngoài
+    biên không chênh lệch giá hoặc không hội tụ có iv = NaN.
+    """
+    price, S, K, r, T, ratio = (a.astype(float).copy() for a in np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (price, S, K, r, T, ratio))))
+    target = price * ratio
+    disc = np.exp(-r*T)
+    with np.errstate(invalid='ignore'):
+        if option_type == 'call':
+            lower, upper = np.maximum(S - K*disc, 0), S
+        else:
+            lower, upper = np.maximum(K*disc - S, 0), K*disc
+        valid = np.isfinite(target) & (S > 0) & (K > 0) & (T > 0) & (target > lower) & (target < upper)
+    lo = np.full(target.shape, lo)
+    hi = np.full(target.shape, hi)
+    # Điểm xuất phát Brenner-Subrahmanyam, kẹp trong khoảng tìm kiếm
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma = np.clip(np.sqrt(2*np.pi/T) * target / S, lo*2, hi/2)
+    sigma = np.where(np.isfinite(sigma), sigma, 0.3)
+    converged = np.zeros(target.shape, dtype=bool)
+    for _ in range(max_iter):
+        a = valid & ~converged
+        if not a.any():
+            break
+        s = sigma[a]
+        g = bs_greeks(S[a], K[a], s, r[a], T[a], option_type)
+        diff = g['price'] - target[a]
+        lo[a] = np.where(diff < 0, s, lo[a])
+        hi[a] = np.where(diff > 0, s, hi[a])
+        done = (np.abs(diff) < tol*np.maximum(1, target[a])) | (hi[a] - lo[a] < tol)
+        vega = g['vega']
+        d1, d2 = d1_d2(S[a], K[a], s, r[a], T[a])
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            newton = diff / vega
+            halley = newton / (1 - 0.5*newton*d1*d2/s)
+            step = np.where(np.isfinite(halley), halley, newton)
+            new = s - step
+        bisect = ~np.isfinite(new) | (new <= lo[a]) | (new >= hi[a]) | (vega < 1e-12)
+        new = np.where(bisect, 0.5*(lo[a] + hi[a]), new)
+        sigma[a] = np.where(done, s, new)
+        converged[a] = done
+    ok = valid & converged
+    return np.where(ok, sigma, np.nan), ok
+
+class IVSurface:
+    """Sigma ngầm định theo từng mã cơ sở (nụ cười/biến động theo moneyness và kỳ hạn).
+
+    update() nhận bảng giá mới và chỉ giải lại IV cho các mã có đầu vào thay đổi.
+    """
+
+    INPUTS = ['market_price', 'underlying_close', 'strike', 'ratio', 'T']
+
+    def __init__(self, r=0.05):
+        self.r = r
+        self.points = pd.DataFrame(columns=['symbol', 'underlying', *self.INPUTS, 'moneyness', 'iv'])
+        self.lock = threading.Lock()
+
+    def update(self, board, today=None):
+        """board có cột symbol, close (giá chứng quyền), underlying, underlying_close, strike, ratio, maturity_date.
+
+        Trả về bảng symbol, iv cho các mã có đủ điều khoản.
+        """
+        cols = ['symbol', 'close', 'underlying', 'underlying_close', 'strike', 'ratio', 'maturity_date']
+        if not all(c in board for c in cols):
+            return pd.DataFrame(columns=['symbol', 'iv'])
+        new = board[cols].dropna().rename(columns={'close': 'market_price'})
+        new = new.assign(T=time_to_maturity(new['maturity_date'], today)).drop(columns='maturity_date')
+        with self.lock:
+            old = self.points.set_index('symbol')
+            prev = old.reindex(new['symbol'])
+            same = (prev[self.INPUTS].to_numpy(dtype=float) == new[self.INPUTS].to_numpy(dtype=float)).all(axis=1)
+            changed = new[~same]
+            iv, _ = implied_vol(changed['market_price'], changed['underlying_close'], changed['strike'],
+                                self.r, changed['T'], changed['ratio'])
+            new = new.assign(iv=prev['iv'].to_numpy(dtype=float), moneyness=new['strike'] / new['underlying_close'])
+            new.loc[~same, 'iv'] = iv
+            # Bảng giá mới là toàn thị trường nên thay hẳn tập điểm cũ
+            self.points = new.reset_index(drop=True)
+            return self.points[['symbol', 'iv']].copy()
+
+    def smile(self, underlying):
+        """Các điểm IV của một mã cơ sở, sắp theo kỳ hạn rồi moneyness (K/S)."""
+        with self.lock:
+            pts = self.points[self.points['underlying'] == underlying]
+        return pts.sort_values(['T', 'moneyness'])[['symbol', 'T', 'strike', 'moneyness', 'iv']]
@@ -0,0 +1,98 @@
+# jobs.py
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+
+class Job:
+    """Một tác vụ chạy nền: trạng thái, tiến độ (done/total), lỗi theo mã và kết quả."""
+
+    def __init__(self, kind, key):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.key = key
+        self.status = 'queued'
+        self.done = 0
+        self.total = None
+        self.errors = {}
+        self.result = None
+        self.created = time.time()
+        self.started = self.finished = None
+        self.trace_id = None
+        self.lock = threading.Lock()
+
+    def set_total(self, total):
+        with self.lock:
+            self.total = total
+
+    def advance(self, symbol=None, status=None):
+        """Ghi nhận một mã đã xong; status là dict của fetch_pipeline (ok/error)."""
+        with self.lock:
+            self.done += 1
+            if status is not None and not status.get('ok', True):
+                self.errors[str(symbol)] = status.get('error')
+
+    def to_dict(self):
+        with self.lock:
+            return {'id': self.id, 'kind': self.kind, 'status': self.status, 'done': self.done,
+                    'total': self.total, 'errors': dict(self.errors), 'created': self.created,
+                    'started': self.started, 'finished': self.finished, 'trace': self.trace_id}
+
+class JobManager:
+    """Hàng đợi tác vụ nền với pool luồng cục bộ.
+
+    Tác vụ cùng key đang chờ/đang chạy được dùng chung: submit trả về job đã có thay vì chạy lại.
+    Chỉ giữ lại `keep` tác vụ gần nhất. Tác vụ gửi từ một yêu cầu đang bật vết (metrics.tracing)
+    cũng được ghi vết riêng; mã vết nằm trong to_dict()['trace'].
+    """
+
+    def __init__(self, max_workers=2, keep=100):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.jobs = OrderedDict()
+        self.inflight = {}
+        self.keep = keep
+        self.lock = threading.Lock()
+
+    def submit(self, kind, func, key=None):
+        """Đưa func(job) vào hàng đợi; trả về (job, created) với created=False nếu dùng chung job cũ."""
+        key = key or kind
+        with self.lock:
+            job = self.inflight.get(key)
+            if job is not None:
+                return job, False
+            job = Job(kind, key)
+            self.jobs[job.id] = job
+            self.inflight[key] = job
+            while len(self.jobs) > self.keep:
+                old_id, old = next(iter(self.jobs.items()))
+                if old.status in ('queued', 'running'):
+                    break
+                del self.jobs[old_id]
+        traced = metrics.TRACE_ALL or metrics.current_trace() is not None
+        self.executor.submit(self._run, job, func, traced)
+        return job, True
+
+    def _run(self, job, func, traced=False):
+        job.status, job.started = 'running', time.time()
+        try:
+            with metrics.tracing(f'job {job.kind}', enabled=traced) as trace:
+                if trace is not None:
+                    job.trace_id = trace.id
+                with metrics.timer('job', kind=job.kind):
+                    job.result = func(job)
+            job.status = 'done'
+        except Exception as e:
+            logging.exception("Tác vụ %s (%s) lỗi", job.id, job.kind)
+            job.result, job.status = str(e), 'error'
+        finally:
+            job.finished = time.time()
+            with self.lock:
+                if self.inflight.get(job.key) is job:
+                    del self.inflight[job.key]
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
@@ -1,24 +1,88 @@
 # main.py (mở rộng)
-from warrant_scraper import fetch_warrant_price
-from data_fetch import fetch_stb, estimate_garch
-from analysis import analyze
-from shap_analysis import analyze_shap
-from portfolio import port
+import logging
+import numpy as np
+from warrant_scraper import listing_symbols, get_warrant_history
+from fetch_pipeline import fetch_many
+from realized_vol import latest_quotes
+from contracts import attach_contracts
+from vol_service import update_underlying_vols, apply_garch_sigma
+from analysis import price_table
+from scheduler import Stage, Pipeline
+import portfolio
 
-df = fetch_stb()
-df = estimate_garch(df)
+PIPELINE_R = 0.05
+PIPELINE_T = 30/252
+PIPELINE_SEED = 20240101
+PIPELINE_INVESTMENT = 100_000_000
+FETCH_WORKERS = 4
+FETCH_RATE = 2.0
+PORTFOLIO_CSV = 'portfolio.csv'
+HEDGES_CSV = 'hedges.csv'
+SHAP_MIN_ROWS = 20
 
-# Lấy giá warrant
-market_price = fetch_warrant_price('STB.W')
-res = analyze(df, market_price)
+def fetch_listing():
+    return listing_symbols()
 
-# Tích hợp SHAP nếu có đủ records
-# explainer, model = analyze_shap(full_df)
+def fetch_bars(symbols):
+    # Kho lịch sử chỉ tải phần phiên còn thiếu
+    histories, status = fetch_many(get_warrant_history, symbols, max_workers=FETCH_WORKERS, rate=FETCH_RATE)
+    errors = sum(not st['ok'] for st in status.values())
+    if errors:
+        logging.warning("Không tải được nến của %d/%d mã", errors, len(symbols))
+    return histories
 
-# Cập nhật portfolio
-port.loc['STB.W'] = [market_price, df['vol'].iloc[-1], res['delta'], res['kelly'], res['action']]
+def estimate_vols(histories):
+    quotes = attach_contracts(latest_quotes(histories), get_warrant_history,
+                              max_workers=FETCH_WORKERS, rate=FETCH_RATE)
+    garch = None
+    if 'underlying' in quotes:
+        garch = update_underlying_vols(quotes['underlying'], max_workers=FETCH_WORKERS, rate=FETCH_RATE)
+        # Định giá theo sigma GARCH của mã cơ sở; mã chưa ước lượng được giữ sigma lịch sử
+        quotes = apply_garch_sigma(quotes, garch)
+    return {'quotes': quotes, 'garch': garch}
 
-# Xác định đơn vị VNĐ với tỷ giá hiện hành
-usd_vnd_rate = fetch_fx_rate('USD', 'VND')
-port['value_vnd'] = port['warrant_price'] * port['position'] * usd_vnd_rate
+def price_warrants(vols):
+    return price_table(vols['quotes'], r=PIPELINE_R, T=PIPELINE_T, seed=PIPELINE_SEED)
 
+def update_portfolio(vols, table):
+    from analysis import time_to_maturity
+    picks = table[table['profit'] > 0]
+    alloc, summary = portfolio.allocate(picks, PIPELINE_INVESTMENT)
+    terms = vols['quotes'].reindex(columns=['symbol', 'underlying', 'underlying_close', 'strike',
+                                            'underlying_sigma', 'ratio', 'maturity_date'])
+    alloc = alloc[alloc['shares'] > 0].merge(terms, on='symbol', how='left')
+    alloc['T'] = np.where(alloc['maturity_date'].notna(), time_to_maturity(alloc['maturity_date']), np.nan)
+    portfolio.port.set_positions(alloc)
+    portfolio.port.to_frame().to_csv(PORTFOLIO_CSV, index=False)
+    hedges = portfolio.port.hedges()
+    hedges.to_csv(HEDGES_CSV, index=False)
+    logging.info("Danh mục: %d vị thế, đầu tư %.0f, tiền mặt %.0f", len(alloc), summary['invested'], summary['cash'])
+    return {'positions': portfolio.port.to_frame(), 'hedges': hedges, **summary}
+
+def explain_prices(vols):
+    # Import sklearn/shap chỉ khi stage này chạy
+    from shap_analysis import analyze_shap, feature_table
+    features = feature_table(vols['quotes'])
+    if len(features) < SHAP_MIN_ROWS:
+        logging.info("Bỏ qua SHAP: chỉ có %d mã đủ điều khoản", len(features))
+        return None
+    res = analyze_shap(features, by='underlying', n_jobs=-1)
+    return res['importance']
+
+def build_pipeline():
+    return Pipeline([
+        Stage('listing', fetch_listing, always=True),
+        Stage('bars', fetch_bars, deps=['listing'], always=True),
+        Stage('vol', estimate_vols, deps=['bars']),
+        Stage('price', price_warrants, deps=['vol']),
+        Stage('portfolio', update_portfolio, deps=['vol', 'price']),
+        Stage('shap', explain_prices, deps=['vol']),
+    ])
+
+def main():
+    """Chạy pipeline một lượt (dùng cho cron); service chạy lâu dài ở runner.py."""
+    return build_pipeline().run()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,233 @@
+# metrics.py
+"""Bộ đếm, bộ đo thời gian và vết (trace) theo từng yêu cầu, xuất dạng văn bản Prometheus.
+
+timer('provider_request', endpoint='history') ghi histogram provider_request_seconds và đếm lỗi
+vào provider_request_errors_total{error=<kiểu lỗi>}. Khi đang có vết (tracing), mỗi lần đo còn
+được ghi thành một span để xem yêu cầu đó tốn thời gian ở bước nào.
+"""
+import contextlib
+import contextvars
+import functools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Mốc histogram thời gian (giây)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Bật vết cho mọi yêu cầu; ngoài ra từng yêu cầu có thể bật riêng (xem dashboard_web)
+TRACE_ALL = os.environ.get('METRICS_TRACE', '') not in ('', '0')
+# Số vết gần nhất được giữ lại
+TRACE_KEEP = 50
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt_labels(labels):
+    if not labels:
+        return ''
+    esc = lambda v: v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{esc(v)}"' for k, v in labels) + '}'
+
+class Registry:
+    """Bộ đếm và histogram theo (tên, nhãn), an toàn đa luồng.
+
+    collector(func): func() sinh các bộ (tên, kiểu, dict nhãn, giá trị) lúc xuất, dùng cho số liệu
+    đã được đếm sẵn ở nơi khác (ví dụ hit/miss của TTLCache).
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None:
+                # số lần rơi vào từng mốc (không cộng dồn), tổng, số lần
+                h = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, edge in enumerate(self.buckets):
+                if value <= edge:
+                    h[0][i] += 1
+                    break
+            h[1] += value
+            h[2] += 1
+
+    def collector(self, func):
+        self.collectors.append(func)
+        return func
+
+    def value(self, name, **labels):
+        """Giá trị hiện tại của bộ đếm (histogram: số lần đo); 0 nếu chưa có."""
+        key = _key(name, labels)
+        with self.lock:
+            if key in self.counters:
+                return self.counters[key]
+            return self.histograms[key][2] if key in self.histograms else 0
+
+    def render(self):
+        """Văn bản theo định dạng exposition của Prometheus."""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {k: (list(h[0]), h[1], h[2]) for k, h in self.histograms.items()}
+        families = OrderedDict()
+        for (name, labels), v in sorted(counters.items()):
+            families.setdefault((name, 'counter'), []).append(f'{name}{_fmt_labels(labels)} {v:g}')
+        for (name, labels), (counts, total, n) in sorted(histograms.items()):
+            lines = families.setdefault((name, 'histogram'), [])
+            cum = 0
+            for edge, c in zip(self.buckets, counts):
+                cum += c
+                lines.append(f'{name}_bucket{_fmt_labels(labels + (("le", f"{edge:g}"),))} {cum}')
+            lines.append(f'{name}_bucket{_fmt_labels(labels + (("le", "+Inf"),))} {n}')
+            lines.append(f'{name}_sum{_fmt_labels(labels)} {total:.6f}')
+            lines.append(f'{name}_count{_fmt_labels(labels)} {n}')
+        for func in self.collectors:
+            for name, kind, labels, v in func():
+                lbl = tuple(sorted((k, str(x)) for k, x in labels.items()))
+                families.setdefault((name, kind), []).append(f'{name}{_fmt_labels(lbl)} {float(v):g}')
+        out = []
+        for (name, kind), lines in families.items():
+            out.append(f'# TYPE {name} {kind}')
+            out.extend(lines)
+        return '\n'.join(out) + '\n'
+
+registry = Registry()
+
+class Trace:
+    """Vết của một yêu cầu/tác vụ: danh sách span (tên, nhãn, bắt đầu, thời lượng) tính từ lúc mở vết."""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.started = time.time()
+        self.t0 = time.perf_counter()
+        self.elapsed = None
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, name, labels, start, elapsed, error=None):
+        span = {'name': name, 'labels': labels, 'start': start - self.t0, 'elapsed': elapsed}
+        if error is not None:
+            span['error'] = error
+        with self.lock:
+            self.spans.append(span)
+
+    def summary(self):
+        """Tổng thời gian và số lần theo tên span, sắp giảm dần theo thời gian."""
+        with self.lock:
+            spans = list(self.spans)
+        agg = {}
+        for s in spans:
+            a = agg.setdefault(s['name'], {'name': s['name'], 'count': 0, 'total': 0.0, 'errors': 0})
+            a['count'] += 1
+            a['total'] += s['elapsed']
+            a['errors'] += 'error' in s
+        return sorted(agg.values(), key=lambda a: -a['total'])
+
+    def to_dict(self, spans=True):
+        out = {'id': self.id, 'name': self.name, 'started': self.started, 'elapsed': self.elapsed,
+               'summary': self.summary()}
+        if spans:
+            with self.lock:
+                out['spans'] = sorted(self.spans, key=lambda s: s['start'])
+        return out
+
+_current = contextvars.ContextVar('metrics_trace', default=None)
+traces = OrderedDict()
+_traces_lock = threading.Lock()
+
+def current_trace():
+    return _current.get()
+
+def start_trace(name):
+    """Mở vết mới cho ngữ cảnh hiện tại (luồng nhận việc qua contextvars.copy_context cũng ghi vào)."""
+    trace = Trace(name)
+    _current.set(trace)
+    return trace
+
+def finish_trace(trace):
+    trace.elapsed = time.perf_counter() - trace.t0
+    if _current.get() is trace:
+        _current.set(None)
+    with _traces_lock:
+        traces[trace.id] = trace
+        while len(traces) > TRACE_KEEP:
+            traces.popitem(last=False)
+    return trace
+
+@contextlib.contextmanager
+def tracing(name, enabled=True):
+    """Chạy khối lệnh trong một vết mới (enabled=False thì không làm gì); trả về Trace hoặc None."""
+    if not enabled:
+        yield None
+        return
+    token = _current.set(None)
+    trace = start_trace(name)
+    try:
+        yield trace
+    finally:
+        finish_trace(trace)
+        _current.reset(token)
+
+def get_trace(trace_id):
+    with _traces_lock:
+        return traces.get(trace_id)
+
+def recent_traces():
+    with _traces_lock:
+        return list(traces.values())[::-1]
+
+def inc(name, value=1, **labels):
+    registry.inc(name, value, **labels)
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+def count_error(name, exc, **labels):
+    """Đếm một lỗi đã được xử lý (không ném tiếp) vào <name>_errors_total theo kiểu lỗi."""
+    registry.inc(f'{name}_errors_total', error=type(exc).__name__, **labels)
+    trace = _current.get()
+    if trace is not None:
+        trace.add(f'{name}_error', labels, time.perf_counter(), 0.0, error=f'{type(exc).__name__}: {exc}')
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    """Đo thời gian khối lệnh vào histogram <name>_seconds; lỗi ném ra được đếm vào <name>_errors_total."""
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+        registry.inc(f'{name}_errors_total', error=type(e).__name__, **labels)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe(f'{name}_seconds', elapsed, **labels)
+        trace = _current.get()
+        if trace is not None:
+            trace.add(name, labels, start, elapsed, error)
+
+def timed(name, **labels):
+    """Decorator: đo mỗi lần gọi hàm bằng timer(name, **labels)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def render():
+    return registry.render()
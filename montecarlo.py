@@ -0,0 +1,137 @@
+# montecarlo.py
+import os
+import zlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy.special import ndtri
+
+def call_payoff(ST, K):
+    return np.maximum(ST - K, 0)
+
+def mc_price(S0, K, sigma, r=0.05, T=30/252, ratio=1, N=None, target_se=None, chunk_size=20000,
+             max_paths=2_000_000, antithetic=True, control_variate=True, confidence=0.95, payoff=call_payoff,
+             seed=None):
+    """Monte Carlo kiểu châu Âu chỉ mô phỏng giá cuối kỳ, sinh theo từng khối để bộ nhớ không đổi.
+
+    S0, K, sigma, r, T, ratio là số hoặc mảng (định giá nhiều mã cùng lúc, mỗi khối có kích thước
+    chunk_size × số mã). Truyền N để cố định số đường, hoặc target_se để chạy tới khi sai số chuẩn
+    của mọi mã ≤ target_se (tối đa max_paths). antithetic dùng cặp Z/-Z; control_variate dùng giá
+    cơ sở chiết khấu làm biến kiểm soát (kỳ vọng đúng bằng S0 theo Black-Scholes).
+    seed là int, SeedSequence hoặc Generator; cùng seed và cùng đầu vào cho cùng kết quả. seed cũng có
+    thể là danh sách luồng, mỗi mã một luồng (như spawn_streams): khi đó giá của một mã không phụ thuộc
+    các mã khác trong lô và giống từng bit với mc_price gọi riêng mã đó bằng luồng của nó.
+    Trả về dict: price, std_error, ci_low, ci_high, n_paths (giá đã chia ratio).
+    """
+    if N is None and target_se is None:
+        N = 20000
+    arrays = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (S0, K, sigma, r, T, ratio)))
+    shape = arrays[0].shape
+    # Mỗi mã một hàng, các đường nằm dọc trục cuối: tổng theo hàng giống hệt tổng của mảng một mã
+    S0, K, sigma, r, T, ratio = (a.reshape(-1, 1) for a in arrays)
+    nsym = S0.shape[0]
+    if isinstance(seed, (list, tuple)):
+        if len(seed) != nsym:
+            raise ValueError(f"Cần {nsym} luồng ngẫu nhiên, nhận {len(seed)}")
+        rngs = [np.random.default_rng(s) for s in seed]
+        draw = lambda m: np.stack([g.standard_normal(m) for g in rngs]) if rngs else np.empty((0, m))
+    else:
+        rng = np.random.default_rng(seed)
+        draw = lambda m: rng.standard_normal((nsym, m))
+    drift = (r - 0.5*sigma**2)*T
+    vol = sigma*np.sqrt(T)
+    disc = np.exp(-r*T)
+    limit = N if N is not None else max_paths
+    # Mỗi mẫu là một cặp đối xứng khi antithetic, nên số đường = 2 × số mẫu
+    per_sample = 2 if antithetic else 1
+    n = 0
+    shift = sY = sYY = sX = sXX = sXY = None
+    while n*per_sample < limit:
+        m = min(chunk_size, -(-(limit - n*per_sample) // per_sample))
+        Z = draw(m)
+        with np.errstate(over='ignore', invalid='ignore'):
+            ST = S0*np.exp(drift + vol*Z)
+            Y = disc*payoff(ST, K)
+            X = disc*ST
+            if antithetic:
+                ST_a = S0*np.exp(drift - vol*Z)
+                Y = 0.5*(Y + disc*payoff(ST_a, K))
+                X = 0.5*(X + disc*ST_a)
+        if shift is None:
+            # Dịch gốc theo khối đầu để tổng bình phương không bị triệt tiêu số học
+            shift = (Y.mean(axis=1, keepdims=True), X.mean(axis=1, keepdims=True))
+            sY, sYY, sX, sXX, sXY = (np.zeros((nsym, 1)) for _ in range(5))
+        Yc, Xc = Y - shift[0], X - shift[1]
+        sY += Yc.sum(axis=1, keepdims=True); sYY += (Yc*Yc).sum(axis=1, keepdims=True)
+        sX += Xc.sum(axis=1, keepdims=True); sXX += (Xc*Xc).sum(axis=1, keepdims=True)
+        sXY += (Xc*Yc).sum(axis=1, keepdims=True)
+        n += m
+        if target_se is not None and n > 1:
+            _, se = _estimate(n, shift, sY, sYY, sX, sXX, sXY, S0, control_variate)
+            if np.all(se/ratio <= target_se):
+                break
+    price, se = _estimate(n, shift, sY, sYY, sX, sXX, sXY, S0, control_variate)
+    z = ndtri(0.5 + confidence/2)
+    price, se = (price/ratio).reshape(shape)[()], (se/ratio).reshape(shape)[()]
+    return {"price": price, "std_error": se, "ci_low": price - z*se, "ci_high": price + z*se, "n_paths": n*per_sample}
+
+def spawn_streams(seed, n):
+    """Tách n luồng ngẫu nhiên con độc lập (mỗi mã một luồng) từ một seed gốc."""
+    if isinstance(seed, np.random.Generator):
+        return seed.spawn(n)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n)
+
+def symbol_streams(seed, symbols):
+    """Luồng ngẫu nhiên của từng mã suy ra từ seed gốc và chính mã (không phụ thuộc vị trí trong lô).
+
+    Cùng seed thì một mã luôn nhận cùng luồng, dù được định giá riêng (analysis.monte_carlo_price)
+    hay trong một bảng bất kỳ (analysis.price_table).
+    """
+    if isinstance(seed, np.random.Generator):
+        seed = seed.bit_generator.seed_seq
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return [np.random.SeedSequence(root.entropy, spawn_key=(*root.spawn_key, zlib.crc32(str(s).upper().encode())))
+            for s in symbols]
+
+def mc_price_parallel(S0, K, sigma, r=0.05, T=30/252, ratio=1, seed=None, workers=None, **kwargs):
+    """Chạy mc_price cho từng mã trên nhiều tiến trình, mỗi mã dùng luồng con riêng từ seed.
+
+    Vì luồng gắn với mã chứ không gắn với tiến trình, kết quả giống hệt từng bit với cùng seed
+    dù workers là 1 hay bao nhiêu. seed cũng có thể là danh sách luồng, mỗi mã một luồng (như
+    symbol_streams). kwargs được chuyển cho mc_price (N, target_se, ...).
+    """
+    arrays = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (S0, K, sigma, r, T, ratio)))
+    shape = arrays[0].shape
+    flat = [a.ravel() for a in arrays]
+    n = flat[0].size
+    streams = seed if isinstance(seed, (list, tuple)) else spawn_streams(seed, n)
+    if len(streams) != n:
+        raise ValueError(f"Cần {n} luồng ngẫu nhiên, nhận {len(streams)}")
+    jobs = [(tuple(a[i] for a in flat), stream, kwargs) for i, stream in enumerate(streams)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or n <= 1:
+        results = [_price_one(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(workers) as ex:
+            results = list(ex.map(_price_one, jobs, chunksize=max(1, n // (4*workers))))
+    keys = ("price", "std_error", "ci_low", "ci_high", "n_paths")
+    return {key: np.array([res[key] for res in results], dtype=float).reshape(shape) for key in keys}
+
+def _price_one(job):
+    args, stream, kwargs = job
+    return mc_price(*args, seed=stream, **kwargs)
+
+def _estimate(n, shift, sY, sYY, sX, sXX, sXY, S0, control_variate):
+    mY, mX = sY/n, sX/n
+    vY = sYY/n - mY**2
+    price = shift[0] + mY
+    if control_variate:
+        vX = sXX/n - mX**2
+        cXY = sXY/n - mX*mY
+        with np.errstate(divide='ignore', invalid='ignore'):
+            beta = np.where(vX > 0, cXY/vX, 0.0)
+        price = price - beta*(shift[1] + mX - S0)
+        vY = vY - beta*cXY
+    se = np.sqrt(np.maximum(vY, 0)/max(n - 1, 1))
+    return price, se
@@ -1,4 +1,154 @@
 # portfolio.py
-import pandas as pd
+import threading
+import numpy as np, pandas as pd
+from greeks import bs_greeks
 
-port = pd.DataFrame(columns=['symbol','warrant_price','vol','delta','kelly','position'])
+# Chứng quyền và cổ phiếu giao dịch theo lô 100; giá lịch sử tính bằng nghìn đồng
+LOT_SIZE = 100
+PRICE_UNIT = 1000
+# Tỷ trọng tối đa mỗi mã và phần vốn giữ lại dạng tiền mặt
+MAX_WEIGHT = 0.2
+CASH_RESERVE = 0.05
+# Kelly phân số: dùng một phần Kelly đầy đủ để giảm rủi ro ước lượng sai lợi thế
+KELLY_SCALE = 1.0
+
+def capped_weights(score, budget=1.0, cap=MAX_WEIGHT):
+    """Tỷ trọng tỷ lệ với score, tổng bằng budget, không mã nào vượt cap (đổ đầy theo mực nước).
+
+    Tìm lambda sao cho sum(min(lambda*score, cap)) = budget trong một lượt sắp xếp: các mã có
+    cap/score nhỏ bị chặn trước, phần dư chia lại cho các mã còn lại theo tỷ lệ score. Nếu mọi mã
+    đều chạm cap mà vẫn chưa đủ budget thì phần còn lại để tiền mặt.
+    """
+    score = np.clip(np.nan_to_num(np.asarray(score, dtype=float)), 0, None)
+    cap = np.broadcast_to(np.asarray(cap, dtype=float), score.shape)
+    w = np.zeros_like(score)
+    pos = score > 0
+    if not pos.any() or budget <= 0:
+        return w
+    s, c = score[pos], cap[pos]
+    order = np.argsort(c / s)
+    s, c = s[order], c[order]
+    # Sau khi k mã đầu bị chặn: tổng = capsum[k] + lambda*rest[k]
+    capsum = np.concatenate([[0.0], np.cumsum(c)])
+    rest = np.concatenate([[s.sum()], s.sum() - np.cumsum(s)])
+    breaks = c / s
+    # Tổng tỷ trọng tại mỗi điểm gãy lambda = breaks[k] (mã k vừa chạm cap)
+    total_at = capsum[:-1] + breaks * rest[:-1]
+    k = np.searchsorted(total_at, budget)
+    if k == len(s):
+        ws = c
+    else:
+        lam = (budget - capsum[k]) / rest[k]
+        ws = np.minimum(lam * s, c)
+    out = np.empty_like(ws)
+    out[order] = ws
+    w[pos] = out
+    return w
+
+def allocate(table, capital, max_weight=MAX_WEIGHT, cash_reserve=CASH_RESERVE, lot_size=LOT_SIZE,
+             price_unit=PRICE_UNIT, kelly_scale=KELLY_SCALE):
+    """Phân bổ vốn theo Kelly có ràng buộc cho bảng (symbol, market_price, kelly), tính một lượt trên mảng.
+
+    Mỗi mã tối đa min(Kelly của mã (đã nhân kelly_scale), max_weight); tổng tỷ trọng không vượt phần
+    vốn đầu tư được (1 - cash_reserve), nếu vượt thì co lại theo tỷ lệ Kelly. Khối lượng làm tròn xuống theo lô;
+    phần lẻ và phần chưa dùng là tiền mặt. Trả về bảng kèm weight, capital, lots, shares, cost
+    và dict tổng hợp (invested, cash).
+    """
+    price = table['market_price'].to_numpy(dtype=float)
+    kelly = np.clip(np.nan_to_num(table['kelly'].to_numpy(dtype=float)) * kelly_scale, 0, None)
+    budget = min(1.0 - cash_reserve, kelly.sum())
+    weight = capped_weights(kelly, budget, np.minimum(kelly, max_weight))
+    target = weight * capital
+    lot_cost = price * price_unit * lot_size
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lots = np.where(lot_cost > 0, np.floor(target / lot_cost), 0)
+    cost = lots * lot_cost
+    out = table.assign(weight=weight, capital=target, lots=lots.astype(int),
+                       shares=(lots * lot_size).astype(int), cost=cost)
+    return out, {'capital': capital, 'invested': float(cost.sum()), 'cash': float(capital - cost.sum())}
+
+class Portfolio:
+    """Danh mục lưu theo mảng NumPy (mỗi vị thế một chỉ số), định giá lại từng phần khi có tick giá.
+
+    Vị thế có đủ điều khoản (S, strike, sigma, T, ratio) được tính lại delta khi giá cơ sở hoặc
+    sigma đổi; vị thế thiếu điều khoản giữ delta đã có, chỉ cập nhật giá trị.
+    """
+
+    def __init__(self, r=0.05, price_unit=PRICE_UNIT):
+        self.r = r
+        self.price_unit = price_unit
+        self.lock = threading.Lock()
+        self.set_positions(pd.DataFrame(columns=['symbol', 'shares', 'market_price']))
+
+    def set_positions(self, table):
+        """table: symbol, shares, market_price, delta; tùy chọn underlying, underlying_close, strike,
+        underlying_sigma, T, ratio (như bảng của allocate ghép điều khoản)."""
+        n = len(table)
+        col = lambda name, default=np.nan: (table[name].to_numpy(dtype=float) if name in table
+                                            else np.full(n, default))
+        with self.lock:
+            self.symbols = table['symbol'].astype(str).to_numpy()
+            self.index = {s: i for i, s in enumerate(self.symbols)}
+            underlying = table['underlying'] if 'underlying' in table else pd.Series(['UNKNOWN'] * n)
+            self.underlyings, self.und_code = np.unique(underlying.fillna('UNKNOWN').astype(str).to_numpy(),
+                                                        return_inverse=True)
+            self.shares = col('shares', 0.0)
+            self.price = col('market_price')
+            self.S = col('underlying_close')
+            self.strike = col('strike')
+            self.sigma = col('underlying_sigma')
+            self.T = col('T')
+            self.ratio = col('ratio', 1.0)
+            self.delta = col('delta', 0.0)
+            self.value = self.shares * self.price * self.price_unit
+            self.revalued = 0
+
+    def tick(self, prices=None, underlying_prices=None, sigma=None):
+        """Cập nhật giá: prices (mã chứng quyền -> giá), underlying_prices (mã cơ sở -> giá),
+        sigma (mã cơ sở -> sigma). Chỉ định giá lại các vị thế có đầu vào đổi; trả về số vị thế đã định giá lại."""
+        with self.lock:
+            old = {f: getattr(self, f).copy() for f in ('price', 'S', 'sigma')}
+            if prices:
+                idx = np.array([self.index[s] for s in prices if s in self.index], dtype=int)
+                self.price[idx] = [prices[s] for s in prices if s in self.index]
+            for mapping, field in ((underlying_prices, 'S'), (sigma, 'sigma')):
+                if mapping:
+                    per_und = pd.Series(mapping, dtype=float).reindex(self.underlyings).to_numpy()
+                    new = per_und[self.und_code]
+                    arr = getattr(self, field)
+                    np.copyto(arr, new, where=~np.isnan(new))
+            changed = np.zeros(len(self.symbols), dtype=bool)
+            for f, before in old.items():
+                after = getattr(self, f)
+                changed |= ~((before == after) | (np.isnan(before) & np.isnan(after)))
+            idx = np.flatnonzero(changed)
+            terms = idx[np.isfinite(self.S[idx]) & np.isfinite(self.strike[idx]) & np.isfinite(self.sigma[idx])
+                        & np.isfinite(self.T[idx])]
+            if len(terms):
+                self.delta[terms] = bs_greeks(self.S[terms], self.strike[terms], self.sigma[terms], self.r,
+                                              self.T[terms], ratio=self.ratio[terms])['delta']
+            self.value[idx] = self.shares[idx] * self.price[idx] * self.price_unit
+            self.revalued += len(idx)
+            return len(idx)
+
+    def hedges(self, lot_size=LOT_SIZE):
+        """Delta gộp theo mã cơ sở (số cổ phiếu tương đương) và số cổ phiếu cần bán khống để trung hòa, làm tròn theo lô."""
+        with self.lock:
+            exposure = np.bincount(self.und_code, weights=self.shares * self.delta, minlength=len(self.underlyings))
+            value = np.bincount(self.und_code, weights=self.value, minlength=len(self.underlyings))
+        hedge = -np.round(exposure / lot_size) * lot_size
+        return pd.DataFrame({'underlying': self.underlyings, 'delta_shares': exposure,
+                             'hedge_shares': hedge.astype(int), 'value': value})
+
+    def to_frame(self):
+        with self.lock:
+            return pd.DataFrame({'symbol': self.symbols, 'underlying': self.underlyings[self.und_code],
+                                 'shares': self.shares, 'price': self.price, 'delta': self.delta,
+                                 'value': self.value})
+
+    def total_value(self):
+        with self.lock:
+            return float(self.value.sum())
+
+# Danh mục dùng chung trong tiến trình (pipeline cập nhật ở stage portfolio)
+port = Portfolio()
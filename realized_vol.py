@@ -0,0 +1,153 @@
+# realized_vol.py
+from collections import deque
+import numpy as np, pandas as pd
+
+# Nguồn sigma duy nhất cho mọi route: đổi ước lượng/cửa sổ ở đây
+SIGMA_ESTIMATOR = 'close'
+SIGMA_WINDOW = 60
+MIN_BARS = 30
+ANNUALIZE = 252
+ESTIMATORS = ('close', 'parkinson', 'garman_klass', 'yang_zhang')
+PANEL_FIELDS = ['open', 'high', 'low', 'close']
+
+def bar_terms(o, h, l, c, prev_c):
+    """Các đại lượng theo từng phiên mà mọi ước lượng đều quy về tổng trượt của chúng.
+
+    Dùng chung cho tính theo panel (mảng) và cập nhật từng phiên (số).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hl = np.log(h / l)
+        co = np.log(c / o)
+        return {
+            'ret': np.log(c / prev_c),                      # close-to-close
+            'park': hl**2 / (4*np.log(2)),                  # Parkinson
+            'gk': 0.5*hl**2 - (2*np.log(2) - 1)*co**2,      # Garman-Klass
+            'overnight': np.log(o / prev_c),                # Yang-Zhang: mở cửa so với đóng cửa trước
+            'intraday': co,
+            'rs': np.log(h / c)*np.log(h / o) + np.log(l / c)*np.log(l / o),  # Rogers-Satchell
+        }
+
+def _sample_var(s1, s2, n):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (s2 - s1**2 / n) / (n - 1)
+
+def combine(estimator, sums, n):
+    """Phương sai một phiên từ các tổng trượt: sums[k] = tổng của term k, sums[k+'2'] = tổng bình phương."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if estimator == 'close':
+            return _sample_var(sums['ret'], sums['ret2'], n)
+        if estimator == 'parkinson':
+            return sums['park'] / n
+        if estimator == 'garman_klass':
+            return sums['gk'] / n
+        if estimator == 'yang_zhang':
+            k = 0.34 / (1.34 + (n + 1) / (n - 1))
+            return (_sample_var(sums['overnight'], sums['overnight2'], n)
+                    + k*_sample_var(sums['intraday'], sums['intraday2'], n) + (1 - k)*sums['rs'] / n)
+    raise ValueError(f'Ước lượng không hợp lệ: {estimator} (chọn trong {ESTIMATORS})')
+
+SQUARED = ('ret', 'overnight', 'intraday')
+
+def to_panel(histories):
+    """Dict mã -> DataFrame nến (time, open, high, low, close) -> dict trường -> bảng rộng ngày x mã."""
+    frames = {s: h.reindex(columns=['time', *PANEL_FIELDS]) for s, h in histories.items()
+              if h is not None and len(h) and 'close' in h}
+    long = pd.concat(frames, names=['symbol']).reset_index('symbol')
+    return long_to_panel(long)
+
+def long_to_panel(long):
+    """Bảng dài (symbol, time, open, high, low, close) -> dict trường -> bảng rộng ngày x mã."""
+    long = long.assign(time=pd.to_datetime(long['time'])).drop_duplicates(['time', 'symbol'], keep='last')
+    # Thiếu open/high/low thì coi như bằng giá đóng cửa (chỉ ước lượng close-to-close còn ý nghĩa)
+    for field in PANEL_FIELDS:
+        long[field] = long[field].fillna(long['close']) if field in long else long['close']
+    wide = long.pivot(index='time', columns='symbol', values=PANEL_FIELDS).sort_index()
+    return {field: wide[field] for field in PANEL_FIELDS}
+
+def realized_vol(panel, estimator=SIGMA_ESTIMATOR, window=SIGMA_WINDOW, annualize=ANNUALIZE, min_bars=MIN_BARS):
+    """Sigma năm hóa theo ngày cho mọi mã cùng lúc (bảng rộng ngày x mã).
+
+    window=None dùng toàn bộ lịch sử. Mỗi phiên chỉ cộng/trừ một phần tử vào tổng trượt nên
+    chi phí là O(số phiên) cho cả bảng, không tính lại std trên toàn lịch sử mỗi lần.
+    """
+    close = panel['close']
+    # Mã thiếu phiên thì so với phiên có giá gần nhất của chính mã đó
+    prev_c = close.ffill().shift(1)
+    terms = bar_terms(panel['open'], panel['high'], panel['low'], close, prev_c)
+    need = {'close': ['ret'], 'parkinson': ['park'], 'garman_klass': ['gk'],
+            'yang_zhang': ['overnight', 'intraday', 'rs']}.get(estimator)
+    if need is None:
+        raise ValueError(f'Ước lượng không hợp lệ: {estimator} (chọn trong {ESTIMATORS})')
+    # Chỉ dùng phiên có đủ mọi term để các tổng cùng số phần tử n
+    valid = np.isfinite(terms[need[0]])
+    for k in need[1:]:
+        valid &= np.isfinite(terms[k])
+    roll = (lambda x: x.rolling(window, min_periods=1)) if window else (lambda x: x.expanding())
+    sums = {}
+    for k in need:
+        x = terms[k].where(valid, 0.0)
+        sums[k] = roll(x).sum()
+        if k in SQUARED:
+            sums[k + '2'] = roll(x**2).sum()
+    n = roll(valid.astype(float)).sum()
+    var = combine(estimator, sums, n)
+    # Đủ MIN_BARS phiên lịch sử (giống điều kiện len(hist) >= 30 trước đây)
+    enough = close.notna().cumsum() >= min_bars
+    return np.sqrt(var.where(enough & (n >= 2) & (var >= 0)) * annualize)
+
+def latest_quotes(histories, estimator=SIGMA_ESTIMATOR, window=SIGMA_WINDOW, min_bars=MIN_BARS):
+    """Giá đóng cửa cuối và sigma hiện tại của từng mã: bảng symbol, close, sigma (tính một lượt trên panel).
+
+    Mã chưa đủ min_bars phiên (ví dụ chứng quyền mới niêm yết) vẫn có dòng với sigma NaN: chúng vẫn
+    định giá được theo mã cơ sở khi có điều khoản (xem analysis.price_table).
+    """
+    histories = {s: h for s, h in histories.items() if h is not None and len(h) and 'close' in h}
+    if window:
+        # Sigma cuối chỉ phụ thuộc `window` lợi suất gần nhất: bỏ phần lịch sử cũ trước khi tính trượt
+        histories = {s: h.tail(max(window + 1, min_bars)) for s, h in histories.items()}
+    if not histories:
+        return pd.DataFrame(columns=['symbol', 'close', 'sigma'])
+    panel = to_panel(histories)
+    sigma = realized_vol(panel, estimator, window, min_bars=min_bars)
+    close = panel['close'].ffill().iloc[-1]
+    # Giữ thứ tự mã như đầu vào
+    symbols = list(histories)
+    return pd.DataFrame({'symbol': symbols, 'close': close[symbols].to_numpy(),
+                         'sigma': sigma.ffill().iloc[-1][symbols].to_numpy()})
+
+class RollingVol:
+    """Sigma cập nhật O(1) mỗi phiên mới: giữ tổng trượt và hàng đợi term của `window` phiên gần nhất."""
+
+    def __init__(self, estimator=SIGMA_ESTIMATOR, window=SIGMA_WINDOW, annualize=ANNUALIZE):
+        if estimator not in ESTIMATORS:
+            raise ValueError(f'Ước lượng không hợp lệ: {estimator} (chọn trong {ESTIMATORS})')
+        self.estimator = estimator
+        self.window = window
+        self.annualize = annualize
+        self.state = {}
+
+    def update(self, symbol, bar):
+        """bar: dict/Series có open, high, low, close. Trả về sigma năm hóa sau phiên này."""
+        st = self.state.setdefault(symbol, {'prev_close': None, 'queue': deque(), 'sums': {}})
+        c = float(bar['close'])
+        o, h, l = (float(bar.get(f, c)) for f in ('open', 'high', 'low'))
+        if st['prev_close'] is not None:
+            terms = {k: float(v) for k, v in bar_terms(o, h, l, c, st['prev_close']).items()}
+            terms.update({k + '2': terms[k]**2 for k in SQUARED})
+            if all(np.isfinite(v) for v in terms.values()):
+                st['queue'].append(terms)
+                for k, v in terms.items():
+                    st['sums'][k] = st['sums'].get(k, 0.0) + v
+                if self.window and len(st['queue']) > self.window:
+                    for k, v in st['queue'].popleft().items():
+                        st['sums'][k] -= v
+        st['prev_close'] = c
+        return self.value(symbol)
+
+    def value(self, symbol):
+        st = self.state.get(symbol)
+        n = len(st['queue']) if st else 0
+        if n < 2:
+            return np.nan
+        var = combine(self.estimator, st['sums'], n)
+        return float(np.sqrt(var * self.annualize)) if var >= 0 else np.nan
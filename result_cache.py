@@ -0,0 +1,21 @@
+# result_cache.py
+import hashlib
+import json
+import pandas as pd
+from warrant_scraper import TTLCache
+
+# Kết quả /analyze (bảng đã định giá + ảnh biểu đồ) theo khóa nội dung; không hết hạn theo thời gian,
+# chỉ bị thay khi dữ liệu đầu vào hoặc tham số đổi (khóa khác) hoặc bị xóa khi tải snapshot mới.
+analyze_cache = TTLCache(ttl=float('inf'), maxsize=16)
+
+def content_key(frames, **config):
+    """Băm nội dung các DataFrame đầu vào cùng tham số định giá thành một khóa hex."""
+    h = hashlib.sha256()
+    for frame in frames:
+        if frame is None:
+            h.update(b'none')
+            continue
+        h.update(json.dumps([str(c) for c in frame.columns]).encode())
+        h.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    h.update(json.dumps(config, sort_keys=True, default=str).encode())
+    return h.hexdigest()
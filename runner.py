@@ -1,9 +1,14 @@
 # runner.py
-import schedule, time
-from main import main
+import logging
+import sys
+from scheduler import SERVICE_LOCK, hold_lock, serve
 
-schedule.every().day.at("18:00").do(main)
-
-while True:
-    schedule.run_pending()
-    time.sleep(60)
+if __name__ == '__main__':
+    # Cron gọi lại định kỳ làm watchdog (schedule_job.py): service đang chạy thì lượt này thoát ngay
+    lock = hold_lock(SERVICE_LOCK)
+    if lock is None:
+        sys.exit(0)
+    logging.basicConfig(level=logging.INFO)
+    from main import build_pipeline
+    # Một tiến trình sống lâu: import, cache và kho lịch sử giữ nóng giữa các lượt 18:00
+    serve(build_pipeline(), at="18:00")
@@ -1,7 +1,30 @@
 # schedule_job.py
+# Cron giữ service pipeline (runner.py) luôn chạy; runner tự chạy lúc 18:00 các ngày thứ 2–6 với khóa
+# pipeline.lock và bỏ qua stage không đổi. Job cũ gọi thẳng main.py bị xóa để không chạy hai lần.
+# runner.py giữ khóa service.lock suốt đời tiến trình và thoát ngay nếu đã có service, nên cùng một lệnh
+# được dùng cho: @reboot (khi máy bật), watchdog mỗi WATCHDOG_MINUTES phút (chạy lại nếu service đã thoát
+# hay bị kill) và lúc cài (chạy ngay, không phải đợi lần khởi động máy sau).
+import os
+import subprocess
+import sys
 from crontab import CronTab
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WATCHDOG_MINUTES = 5
+START = f'cd {HERE} && {sys.executable} runner.py >> pipeline.log 2>&1'
+
 cron = CronTab(user=True)
-job = cron.new(command='python3 /path/to/main.py >> /path/to/stb.log 2>&1', comment="STB warrant hedge")
-job.setall('0 18 * * 1-5')  # chạy lúc 18:00 các ngày thứ 2–6
+cron.remove_all(comment="STB warrant hedge")
+cron.remove_all(comment="warrant pipeline")
+boot = cron.new(command=START, comment="warrant pipeline")
+boot.every_reboot()
+watchdog = cron.new(command=START, comment="warrant pipeline")
+watchdog.minute.every(WATCHDOG_MINUTES)
 cron.write()
-print("Cron job created:", job)
+print("Cron job created:", boot)
+print("Cron job created:", watchdog)
+# Khởi động ngay, tách khỏi terminal cài đặt
+with open(os.path.join(HERE, 'pipeline.log'), 'a') as log:
+    subprocess.Popen([sys.executable, 'runner.py'], cwd=HERE, stdout=log, stderr=subprocess.STDOUT,
+                     stdin=subprocess.DEVNULL, start_new_session=True)
+print("Service pipeline đã khởi động (log: pipeline.log)")
@@ -0,0 +1,157 @@
+# scheduler.py
+import datetime
+import hashlib
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+from result_cache import content_key
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ còn khóa trong tiến trình
+    fcntl = None
+
+PIPELINE_LOCK = 'pipeline.lock'
+SERVICE_LOCK = 'service.lock'
+
+def fingerprint(obj):
+    """Băm nội dung kết quả một stage (DataFrame, dict/list lồng nhau hoặc giá trị JSON được)."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return content_key([obj.to_frame() if isinstance(obj, pd.Series) else obj])
+    if isinstance(obj, dict):
+        items = sorted((str(k), fingerprint(v)) for k, v in obj.items())
+        return hashlib.sha256(json.dumps(items).encode()).hexdigest()
+    if isinstance(obj, (list, tuple)):
+        return hashlib.sha256(json.dumps([fingerprint(v) for v in obj]).encode()).hexdigest()
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
+
+class Stage:
+    """Một bước của pipeline: func nhận kết quả các stage phụ thuộc (theo thứ tự deps).
+
+    always=True cho stage nguồn (đọc dữ liệu bên ngoài) luôn chạy; các stage khác chỉ chạy lại
+    khi dấu vân tay đầu vào khác lần chạy thành công trước.
+    """
+
+    def __init__(self, name, func, deps=(), always=False):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.always = always
+
+class Pipeline:
+    """DAG các stage chạy tuần tự theo thứ tự phụ thuộc, giữ kết quả trong bộ nhớ giữa các lần chạy."""
+
+    def __init__(self, stages, lock_path=PIPELINE_LOCK):
+        self.stages = {}
+        for stage in stages:
+            missing = [d for d in stage.deps if d not in self.stages]
+            if missing:
+                raise ValueError(f'Stage {stage.name} phụ thuộc stage chưa khai báo: {missing}')
+            self.stages[stage.name] = stage
+        self.lock_path = lock_path
+        self.lock = threading.Lock()
+        self.outputs = {}
+        self.input_keys = {}
+        self.output_keys = {}
+        self.last_run = None
+
+    @contextmanager
+    def _file_lock(self):
+        """Khóa file để cron/tiến trình khác không chạy chồng lên service này."""
+        if fcntl is None or self.lock_path is None:
+            yield True
+            return
+        with open(self.lock_path, 'w') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def run(self, force=False):
+        """Chạy một lượt. Trả về báo cáo theo stage (status, elapsed), hoặc None nếu lượt trước chưa xong."""
+        if not self.lock.acquire(blocking=False):
+            logging.warning("Pipeline đang chạy, bỏ qua lượt này")
+            return None
+        try:
+            with self._file_lock() as locked:
+                if not locked:
+                    logging.warning("Pipeline đang chạy ở tiến trình khác (%s), bỏ qua lượt này", self.lock_path)
+                    return None
+                return self._run(force)
+        finally:
+            self.lock.release()
+
+    def _run(self, force):
+        report = {}
+        started = time.perf_counter()
+        for name, stage in self.stages.items():
+            if any(report[d]['status'] in ('failed', 'blocked') for d in stage.deps):
+                report[name] = {'status': 'blocked', 'elapsed': 0.0}
+                continue
+            key = fingerprint([self.output_keys[d] for d in stage.deps])
+            if not (force or stage.always) and name in self.outputs and self.input_keys.get(name) == key:
+                report[name] = {'status': 'skipped', 'elapsed': 0.0}
+                continue
+            t0 = time.perf_counter()
+            try:
+                out = stage.func(*(self.outputs[d] for d in stage.deps))
+            except Exception as e:
+                logging.exception("Stage %s lỗi", name)
+                report[name] = {'status': 'failed', 'elapsed': time.perf_counter() - t0, 'error': str(e)}
+                continue
+            self.outputs[name] = out
+            self.input_keys[name] = key
+            self.output_keys[name] = fingerprint(out)
+            report[name] = {'status': 'ran', 'elapsed': time.perf_counter() - t0}
+        for name, st in report.items():
+            logging.info("Stage %-10s %-8s %.2fs", name, st['status'], st['elapsed'])
+        self.last_run = {'finished_at': datetime.datetime.now().isoformat(timespec='seconds'),
+                         'elapsed': time.perf_counter() - started, 'stages': report}
+        return report
+
+def next_run_time(now, at='18:00', weekdays_only=True):
+    """Thời điểm chạy kế tiếp sau now (giờ HH:MM, bỏ thứ 7/chủ nhật nếu weekdays_only)."""
+    hour, minute = map(int, at.split(':'))
+    run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run <= now:
+        run += datetime.timedelta(days=1)
+    while weekdays_only and run.weekday() >= 5:
+        run += datetime.timedelta(days=1)
+    return run
+
+def hold_lock(path):
+    """Khóa file giữ suốt đời tiến trình để mỗi máy chỉ có một service.
+
+    Trả về file đang giữ khóa (phải giữ tham chiếu), hoặc None nếu tiến trình khác đã giữ.
+    """
+    f = open(path, 'a')
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return None
+    return f
+
+def serve(pipeline, at='18:00', weekdays_only=True, run_now=False):
+    """Service chạy lâu dài: ngủ tới giờ chạy kế tiếp thay vì thăm dò mỗi phút.
+
+    Import, cache và kho lịch sử được giữ nóng trong tiến trình giữa các lượt.
+    """
+    if run_now:
+        pipeline.run()
+    while True:
+        run = next_run_time(datetime.datetime.now(), at, weekdays_only)
+        logging.info("Lượt chạy kế tiếp: %s", run.isoformat(timespec='minutes'))
+        while (wait := (run - datetime.datetime.now()).total_seconds()) > 0:
+            # Ngủ từng đoạn để không trễ khi đồng hồ máy bị chỉnh
+            time.sleep(min(wait, 3600))
+        pipeline.run()
@@ -1,13 +1,104 @@
 # shap_analysis.py
-import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
-import shap
-
-def analyze_shap(df):
-    X = df.drop(['warrant_price'], axis=1)
-    y = df['warrant_price']
-    model = RandomForestRegressor(n_estimators=100)
+import json
+import os
+import numpy as np, pandas as pd
+
+SHAP_DIR = 'data/shap'
+# Số dòng tối đa được giải thích mỗi lần (TreeExplainer tốn thời gian tỷ lệ với số dòng)
+SHAP_BUDGET = 2000
+SHAP_STRATA = 10
+
+def stratified_sample(df, n, by=None, strata=SHAP_STRATA, seed=0):
+    """Lấy đúng n dòng (hoặc cả bảng nếu ít hơn), chia theo nhóm: cột `by` nếu có, ngược lại theo phân vị của cột đầu tiên.
+
+    Mỗi nhóm có ít nhất 1 dòng để nhóm nhỏ vẫn có mặt; phần còn lại chia theo tỷ lệ kích thước nhóm
+    bằng phương pháp dư lớn nhất, nên tổng hạn mức đúng bằng n và không nhóm nào bị cắt bớt.
+    Có nhiều nhóm hơn n thì lấy 1 dòng ở n nhóm lớn nhất.
+    """
+    if len(df) <= n:
+        return df
+    groups = df[by] if by is not None else pd.qcut(df.iloc[:, 0].rank(method='first'), strata, labels=False)
+    sizes = groups.value_counts()
+    if len(sizes) >= n:
+        take = pd.Series(1, index=sizes.index[:n])
+    else:
+        share = (sizes - 1) / (len(df) - len(sizes)) * (n - len(sizes))
+        take = np.floor(share).astype(int)
+        left = n - len(sizes) - int(take.sum())
+        take.loc[(share - take).sort_values(ascending=False, kind='mergesort').index[:left]] += 1
+        take += 1
+    parts = [g.sample(take[key], random_state=seed) for key, g in df.groupby(groups, sort=False) if key in take.index]
+    return pd.concat(parts)
+
+def feature_table(quotes, today=None):
+    """Bảng đặc trưng cho mô hình giá từ snapshot có điều khoản (xem contracts.attach_contracts)."""
+    from analysis import time_to_maturity
+    cols = ['symbol', 'close', 'sigma', 'underlying', 'underlying_close', 'underlying_sigma', 'strike', 'ratio', 'maturity_date']
+    df = quotes.reindex(columns=cols).dropna()
+    return pd.DataFrame({
+        'symbol': df['symbol'], 'underlying': df['underlying'], 'warrant_price': df['close'],
+        'sigma': df['sigma'], 'underlying_sigma': df['underlying_sigma'],
+        'moneyness': df['underlying_close'] / df['strike'], 'ratio': df['ratio'],
+        'T': time_to_maturity(df['maturity_date'], today),
+    }).reset_index(drop=True)
+
+def analyze_shap(df, target='warrant_price', n_estimators=100, n_jobs=-1, budget=SHAP_BUDGET, by=None,
+                 background=None, min_samples_leaf=5, out_dir=SHAP_DIR, seed=0):
+    """Huấn luyện RandomForest song song (n_jobs) và giải thích bằng SHAP trên một mẫu phân tầng.
+
+    Chỉ tối đa `budget` dòng được giải thích (theo nhóm `by`, mặc định theo phân vị của target).
+    background: số dòng nền cho TreeExplainer kiểu interventional; None dùng thống kê của chính cây
+    (nhanh hơn). Mô hình, giá trị SHAP, độ quan trọng và ảnh được lưu vào out_dir (out_dir=None để
+    không lưu). Ảnh được vẽ bằng backend Agg ra file, không mở cửa sổ. Thời gian giải thích tăng theo
+    số lá của cây nên min_samples_leaf mặc định 5 thay vì 1.
+    """
+    from sklearn.ensemble import RandomForestRegressor
+    import shap
+    y = df[target]
+    X = df.drop(columns=[target]).select_dtypes('number')
+    model = RandomForestRegressor(n_estimators=n_estimators, n_jobs=n_jobs, random_state=seed,
+                                  min_samples_leaf=min_samples_leaf)
     model.fit(X, y)
-    explainer = shap.TreeExplainer(model)
-    shap.summary_plot(explainer.shap_values(X), X)
-    return explainer, model
+    strata = df[[by]] if by is not None else y.to_frame()
+    sample = stratified_sample(strata, budget, by=by, seed=seed).index
+    Xs = X.loc[sample]
+    if background:
+        explainer = shap.TreeExplainer(model, data=X.sample(min(background, len(X)), random_state=seed),
+                                       feature_perturbation='interventional')
+    else:
+        explainer = shap.TreeExplainer(model)
+    values = pd.DataFrame(explainer.shap_values(Xs, check_additivity=False), index=Xs.index, columns=X.columns)
+    importance = values.abs().mean().sort_values(ascending=False)
+    result = {'model': model, 'explainer': explainer, 'shap_values': values, 'importance': importance,
+              'explained_rows': len(Xs), 'total_rows': len(X)}
+    if out_dir is not None:
+        result['files'] = save_shap(result, Xs, df.loc[sample], out_dir)
+    return result
+
+def save_shap(result, Xs, rows, out_dir=SHAP_DIR):
+    """Lưu mô hình (joblib), giá trị SHAP, độ quan trọng và ảnh summary/bar (PNG)."""
+    import joblib
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import shap
+    from charts import render_bar_png
+    os.makedirs(out_dir, exist_ok=True)
+    files = {name: os.path.join(out_dir, fname) for name, fname in [
+        ('model', 'model.joblib'), ('shap_values', 'shap_values.csv'), ('importance', 'importance.csv'),
+        ('summary_png', 'summary.png'), ('importance_png', 'importance.png'), ('meta', 'meta.json')]}
+    joblib.dump(result['model'], files['model'])
+    # Giữ cột định danh (symbol, ...) để biết mỗi dòng SHAP thuộc mã nào
+    ids = rows.drop(columns=Xs.columns, errors='ignore').select_dtypes(exclude='number')
+    ids.join(result['shap_values']).to_csv(files['shap_values'])
+    result['importance'].rename('mean_abs_shap').to_csv(files['importance'], index_label='feature')
+    shap.summary_plot(result['shap_values'].to_numpy(), Xs, show=False)
+    plt.savefig(files['summary_png'], bbox_inches='tight')
+    plt.close('all')
+    with open(files['importance_png'], 'wb') as f:
+        f.write(render_bar_png(result['importance'].index, result['importance'].to_numpy(),
+                               title='Độ quan trọng SHAP', ylabel='mean |SHAP|'))
+    with open(files['meta'], 'w') as f:
+        json.dump({'explained_rows': result['explained_rows'], 'total_rows': result['total_rows'],
+                   'features': list(Xs.columns)}, f, indent=1)
+    return files
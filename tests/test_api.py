@@ -0,0 +1,84 @@
+import base64
+import json
+import pandas as pd
+import pytest
+import dashboard_web
+
+KEY = 'a' * 64
+
+@pytest.fixture
+def client(monkeypatch):
+    table = pd.DataFrame({
+        'symbol': [f'CACB{i:04d}' for i in range(23)] + ['CVIC2401'],
+        'market_price': 1.0, 'model_price': 2.0, 'delta': 0.5, 'kelly': 0.1, 'action': 'LONG',
+        'profit': [float(i % 5) for i in range(24)],
+        # CVIC2401 có mã cơ sở theo điều khoản là VHM, khác với mẫu mã (VIC)
+        'underlying': ['ACB'] * 23 + ['VHM'],
+    })
+    monkeypatch.setattr(dashboard_web, 'load_priced_table', lambda: (table, KEY))
+    return dashboard_web.app.test_client()
+
+def cursor(k, offset):
+    return base64.urlsafe_b64encode(json.dumps({'k': k, 'o': offset}).encode()).decode()
+
+def test_cursor_paging_visits_every_row_once(client):
+    seen, url = [], '/api/warrants?limit=7'
+    while True:
+        body = client.get(url).get_json()
+        assert body['total'] == 24
+        seen += [row['symbol'] for row in body['data']]
+        if body['next_cursor'] is None:
+            break
+        url = f'/api/warrants?limit=7&cursor={body["next_cursor"]}'
+    assert len(seen) == 24 and len(set(seen)) == 24
+
+@pytest.mark.parametrize('limit', ['0', '-3', 'abc', '1.5'])
+def test_invalid_limit_rejected(client, limit):
+    assert client.get(f'/api/warrants?limit={limit}').status_code == 400
+
+@pytest.mark.parametrize('value', ['not-base64!!', base64.urlsafe_b64encode(b'[1]').decode(),
+                                   cursor(KEY[:16], -5), cursor(KEY[:16], 'x')])
+def test_invalid_cursor_rejected(client, value):
+    assert client.get(f'/api/warrants?cursor={value}').status_code == 400
+
+def test_stale_cursor_gone(client):
+    assert client.get(f'/api/warrants?cursor={cursor("b" * 16, 7)}').status_code == 410
+
+def test_underlying_filter_uses_contract_column(client):
+    rows = client.get('/api/warrants?underlying=VHM').get_json()['data']
+    assert [row['symbol'] for row in rows] == ['CVIC2401']
+    assert client.get('/api/warrants?underlying=VIC').get_json()['total'] == 0
+
+def test_load_priced_table_keeps_contract_underlying(tmp_path, monkeypatch):
+    from warrant_store import write_table
+    for name in ('SNAPSHOT_DIR', 'TRADE_DIR', 'TRADE_STATS_DIR'):
+        monkeypatch.setattr(dashboard_web, name, str(tmp_path / name))
+    for name in ('DATA_CSV', 'TRADE_CSV', 'TRADE_STATS_CSV'):
+        monkeypatch.setattr(dashboard_web, name, str(tmp_path / f'{name}.csv'))
+    dashboard_web.analyze_cache.clear()
+    snapshot = pd.DataFrame({'symbol': ['CVIC2401', 'CACB2402'], 'close': [1.2, 0.8], 'sigma': [0.4, 0.3],
+                             'underlying': ['VHM', None]})
+    write_table(snapshot, dashboard_web.SNAPSHOT_DIR)
+    table, _ = dashboard_web.load_priced_table()
+    dashboard_web.analyze_cache.clear()
+    assert dict(zip(table['symbol'], table['underlying'])) == {'CVIC2401': 'VHM', 'CACB2402': 'ACB'}
+
+def test_load_priced_table_uses_ssi_quotes(tmp_path, monkeypatch):
+    from warrant_store import write_table
+    for name in ('SNAPSHOT_DIR', 'TRADE_DIR', 'TRADE_STATS_DIR'):
+        monkeypatch.setattr(dashboard_web, name, str(tmp_path / name))
+    for name in ('DATA_CSV', 'TRADE_CSV', 'TRADE_STATS_CSV'):
+        monkeypatch.setattr(dashboard_web, name, str(tmp_path / f'{name}.csv'))
+    dashboard_web.analyze_cache.clear()
+    dashboard_web.ssi_quotes_cache.clear()
+    write_table(pd.DataFrame({'symbol': ['CACB2401', 'CFPT2401'], 'close': [1.2, 0.8], 'sigma': [0.4, 0.3]}),
+                dashboard_web.SNAPSHOT_DIR)
+    _, close_key = dashboard_web.load_priced_table()
+    monkeypatch.setattr(dashboard_web, 'SSI_QUOTES', True)
+    monkeypatch.setattr(dashboard_web, 'market_quotes',
+                        lambda symbols: pd.DataFrame({'symbol': ['CACB2401'], 'market_price': [1.5]}))
+    table, key = dashboard_web.load_priced_table()
+    dashboard_web.analyze_cache.clear()
+    dashboard_web.ssi_quotes_cache.clear()
+    assert dict(zip(table['symbol'], table['market_price'])) == {'CACB2401': 1.5, 'CFPT2401': 0.8}
+    assert key != close_key
@@ -0,0 +1,66 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import pytest
+from analysis import with_market_prices
+from api_client import SSIClient
+
+class StubSSI(BaseHTTPRequestHandler):
+    """Server SSI giả: CFLAKY trả 503 hai lần đầu, CDEAD luôn 503, mã khác trả giá ngay."""
+    hits = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        symbol = self.path.rstrip('/').split('/')[-1]
+        with self.lock:
+            self.hits.setdefault(symbol, []).append(time.monotonic())
+            n = len(self.hits[symbol])
+        if symbol == 'CDEAD' or (symbol == 'CFLAKY' and n <= 2):
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps({'price': 1.5 if symbol == 'CFLAKY' else 2.0}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    StubSSI.hits = {}
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StubSSI)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_retry_on_503_with_backoff(server):
+    with SSIClient(base_url=server, retries=3, backoff=0.1) as client:
+        assert client.quote('CFLAKY') == 1.5
+    hits = StubSSI.hits['CFLAKY']
+    assert len(hits) == 3
+    # urllib3: lần thử lại thứ hai chờ backoff × 2
+    assert hits[2] - hits[1] >= 0.2 * 0.9
+
+def test_bulk_quotes_partial_failure(server):
+    with SSIClient(base_url=server, retries=2, backoff=0.01, max_workers=4, rate=1000) as client:
+        quotes = client.quotes(['cacb2401', 'CFLAKY', 'CDEAD', 'CFPT2401'])
+    assert dict(zip(quotes['symbol'], quotes['market_price'])) == {'CACB2401': 2.0, 'CFLAKY': 1.5, 'CFPT2401': 2.0}
+    assert len(StubSSI.hits['CDEAD']) == 3
+
+def test_live_prices_fall_back_to_close():
+    table = pd.DataFrame({'symbol': ['A', 'B'], 'market_price': [1.0, 1.0], 'model_price': [1.2, 1.2],
+                          'delta': 0.5, 'kelly': 0.1, 'action': 'LONG', 'profit': 0.2})
+    out = with_market_prices(table, pd.DataFrame({'symbol': ['A'], 'market_price': [1.5]}))
+    assert list(out['market_price']) == [1.5, 1.0]
+    assert list(out['action']) == ['SHORT', 'LONG']
+    assert list(out['price_source']) == ['ssi', 'close']
+    assert out['profit'].tolist() == pytest.approx([-0.3, 0.2])
@@ -0,0 +1,33 @@
+import numpy as np, pandas as pd
+from analysis import batch_price, monte_carlo_price, price_table
+from montecarlo import mc_price, spawn_streams
+
+S0 = np.array([10.0, 20.0, 30.0, 12.0])
+K = np.array([10.0, 25.0, 28.0, 11.0])
+SIGMA = np.array([0.3, 0.5, 0.2, 0.4])
+
+def test_batch_price_same_for_any_worker_count():
+    serial = batch_price(S0, K, SIGMA, N=4000, seed=7)['model_price']
+    for workers in (1, 2):
+        parallel = batch_price(S0, K, SIGMA, N=4000, seed=7, workers=workers)['model_price']
+        np.testing.assert_array_equal(serial, parallel)
+
+def test_price_of_symbol_independent_of_batch():
+    full = batch_price(S0, K, SIGMA, N=4000, seed=7)['model_price']
+    head = batch_price(S0[:2], K[:2], SIGMA[:2], N=4000, seed=7)['model_price']
+    np.testing.assert_array_equal(full[:2], head)
+
+def test_stream_list_matches_single_symbol_calls():
+    streams = spawn_streams(3, len(S0))
+    vector = mc_price(S0, K, SIGMA, N=3000, seed=streams)['price']
+    single = [mc_price(S0[i], K[i], SIGMA[i], N=3000, seed=stream)['price'] for i, stream in enumerate(spawn_streams(3, len(S0)))]
+    np.testing.assert_array_equal(vector, single)
+
+def test_single_symbol_price_matches_table():
+    df = pd.DataFrame({'symbol': ['CFPT2401', 'CMWG2402', 'CVHM2403'], 'close': [1.2, 2.5, 0.8], 'sigma': [0.4, 0.6, 0.5]})
+    table = price_table(df, N=4000, seed=11).set_index('symbol')
+    # Route "/" định giá riêng một mã; "/analyze" định giá cả bảng, thứ tự khác nhau vẫn cùng giá
+    reordered = price_table(df.iloc[::-1], N=4000, seed=11, workers=1).set_index('symbol')
+    for row in df.itertuples():
+        single = monte_carlo_price(row.close, row.sigma, 0.05, 30/252, row.close, N=4000, seed=11, symbol=row.symbol)
+        assert single == table.loc[row.symbol, 'model_price'] == reordered.loc[row.symbol, 'model_price']
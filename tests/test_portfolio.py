@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+from portfolio import allocate, capped_weights, Portfolio, LOT_SIZE, PRICE_UNIT
+
+@pytest.mark.parametrize('seed', range(5))
+def test_capped_weights_respect_caps_and_budget(seed):
+    rng = np.random.default_rng(seed)
+    score = rng.uniform(0, 1, 40)
+    cap = rng.uniform(0.01, 0.2, 40)
+    w = capped_weights(score, 0.9, cap)
+    assert np.all(w <= cap + 1e-12) and np.all(w >= 0)
+    assert w.sum() == pytest.approx(min(0.9, cap.sum()))
+
+def test_allocate_respects_kelly_cap_and_total():
+    table = pd.DataFrame({'symbol': [f'C{i}' for i in range(8)],
+                          'market_price': [1.2, 0.5, 2.0, 3.1, 0.9, 1.5, 0.7, 2.5],
+                          'kelly': [0.1, 0.4, 0.05, 0.3, 0.25, 0.0, -0.2, 0.15]})
+    out, summary = allocate(table, 1e9, max_weight=0.2, cash_reserve=0.05)
+    kelly = table['kelly'].clip(lower=0)
+    assert np.all(out['weight'] <= np.minimum(kelly, 0.2) + 1e-12)
+    assert out['weight'].sum() <= 1.0 and out['weight'].sum() <= 0.95 + 1e-12
+    assert (out.loc[table['kelly'] <= 0, 'weight'] == 0).all()
+    # Khối lượng theo lô, chi phí không vượt vốn phân bổ
+    assert (out['shares'] % LOT_SIZE == 0).all()
+    assert np.all(out['cost'] <= out['capital'] + 1e-6)
+    assert summary['invested'] + summary['cash'] == pytest.approx(1e9)
+    assert np.allclose(out['cost'], out['shares'] * out['market_price'] * PRICE_UNIT)
+
+def test_small_kelly_total_is_not_scaled_up():
+    table = pd.DataFrame({'symbol': ['A', 'B'], 'market_price': [1.0, 1.0], 'kelly': [0.02, 0.03]})
+    out, _ = allocate(table, 1e8)
+    assert np.allclose(out['weight'], [0.02, 0.03])
+
+def test_portfolio_tick_revalues_only_changed_positions():
+    port = Portfolio()
+    port.set_positions(pd.DataFrame({'symbol': ['A', 'B'], 'shares': [100, 200], 'market_price': [1.0, 2.0],
+                                     'underlying': ['X', 'Y'], 'delta': [0.5, 0.4]}))
+    assert port.tick(prices={'A': 1.5}) == 1
+    assert port.total_value() == pytest.approx((100 * 1.5 + 200 * 2.0) * PRICE_UNIT)
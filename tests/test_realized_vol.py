@@ -0,0 +1,36 @@
+import numpy as np, pandas as pd, pytest
+from analysis import price_table
+from realized_vol import ESTIMATORS, MIN_BARS, SIGMA_WINDOW, latest_quotes, realized_vol, to_panel
+
+def history(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    return pd.DataFrame({'time': pd.bdate_range('2024-01-01', periods=n), 'close': close})
+
+def test_new_warrant_priced_from_underlying():
+    quotes = latest_quotes({'COLD': history(MIN_BARS + 10), 'CNEW': history(5, 1), 'CBARE': history(5, 2)})
+    assert list(quotes['symbol']) == ['COLD', 'CNEW', 'CBARE']
+    assert quotes['sigma'].notna().tolist() == [True, False, False]
+    terms = pd.DataFrame({'symbol': ['COLD', 'CNEW', 'CBARE'], 'underlying_close': [25.0, 25.0, np.nan],
+                          'underlying_sigma': [0.3, 0.3, np.nan], 'strike': [24.0, 26.0, np.nan],
+                          'ratio': [2.0, 2.0, np.nan], 'maturity_date': ['2030-01-01', '2030-01-01', None]})
+    table = price_table(quotes.merge(terms, on='symbol'), N=2000, seed=1, today='2029-07-01')
+    # CNEW chưa có sigma riêng nhưng đủ điều khoản; CBARE thiếu cả hai nên bị bỏ
+    assert list(table['symbol']) == ['COLD', 'CNEW']
+    assert np.isfinite(table['model_price']).all()
+
+def test_trimmed_history_matches_full_roll():
+    rng = np.random.default_rng(3)
+    histories = {}
+    for i, n in enumerate([500, 200, SIGMA_WINDOW + 1, MIN_BARS, 10]):
+        h = history(n, i)
+        h['open'] = h['close'] * np.exp(rng.normal(0, 0.01, n))
+        h['high'] = h[['open', 'close']].max(axis=1) * 1.01
+        h['low'] = h[['open', 'close']].min(axis=1) * 0.99
+        # Lịch giao dịch chung: mọi mã kết thúc cùng phiên cuối
+        h['time'] = pd.bdate_range(end='2024-12-31', periods=n)
+        histories[f'C{i}'] = h
+    for estimator in ESTIMATORS:
+        full = realized_vol(to_panel(histories), estimator).ffill().iloc[-1]
+        quotes = latest_quotes(histories, estimator).set_index('symbol')
+        assert quotes['sigma'].to_numpy() == pytest.approx(full[quotes.index].to_numpy(), rel=1e-9, nan_ok=True)
@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+from shap_analysis import stratified_sample
+
+def test_sample_has_exactly_n_rows_and_keeps_every_group():
+    sizes = {'A': 500, 'B': 300, 'C': 7, 'D': 3, 'E': 1, 'F': 190}
+    df = pd.DataFrame({'g': np.repeat(list(sizes), list(sizes.values())), 'x': np.arange(sum(sizes.values()))})
+    sample = stratified_sample(df, 97, by='g')
+    assert len(sample) == 97 and sample.index.is_unique
+    counts = sample['g'].value_counts()
+    assert set(counts.index) == set(sizes)
+    # Nhóm lớn lấy theo tỷ lệ, không bị cắt vì đứng cuối
+    assert abs(counts['F'] - 97 * 190 / 1001) <= 2
+
+def test_more_groups_than_budget():
+    df = pd.DataFrame({'g': np.arange(20).repeat(2), 'x': np.arange(40)})
+    assert len(stratified_sample(df, 5, by='g')) == 5
+
+def test_quantile_strata_default():
+    df = pd.DataFrame({'y': np.random.default_rng(0).normal(size=1000)})
+    assert len(stratified_sample(df, 123)) == 123
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from trade_stats import compute_trade_stats, update_trade_stats
+
+def tape(rows):
+    return pd.DataFrame(rows, columns=['symbol', 'time', 'price', 'volume'])
+
+def by_symbol(df):
+    return df.sort_values('symbol').reset_index(drop=True)
+
+def day_tape(n=150):
+    t0 = pd.Timestamp('2024-01-02 09:15')
+    return pd.DataFrame({'symbol': 'CACB2401', 'time': [t0 + pd.Timedelta(seconds=10 * i) for i in range(n)],
+                         'price': np.round(np.linspace(1.0, 2.0, n), 4), 'volume': 100 * (1 + np.arange(n) % 7)})
+
+def test_incremental_update_matches_full_recompute():
+    t = pd.Timestamp('2024-01-02 09:15')
+    s = pd.Timedelta(seconds=1)
+    morning = tape([('A', t, 1.0, 100), ('B', t, 2.0, 50), ('A', t + s, 1.1, 200)])
+    day = tape([('A', t, 1.0, 100), ('B', t, 2.0, 50), ('A', t + s, 1.1, 200), ('C', t, 3.0, 10),
+                ('B', t + 2*s, 2.2, 30), ('A', t + 3*s, 1.2, 10)])
+    updated = update_trade_stats(compute_trade_stats(morning), day)
+    assert_frame_equal(by_symbol(updated), by_symbol(compute_trade_stats(day)), check_dtype=False)
+
+def test_sliding_window_counts_only_new_ticks():
+    # Nguồn chỉ trả cửa sổ lệnh gần nhất: lần đầu lệnh 0–99, lần sau lệnh 50–149
+    full = day_tape()
+    updated = update_trade_stats(compute_trade_stats(full.iloc[:100]), full.iloc[50:])
+    expected = compute_trade_stats(full)
+    assert_frame_equal(by_symbol(updated), by_symbol(expected), check_dtype=False)
+    assert updated['last_trade_price'].iloc[0] == 2.0
+    assert updated['trade_count'].iloc[0] == 150
+
+def test_ticks_sharing_last_second_are_not_double_counted():
+    t = pd.Timestamp('2024-01-02 10:00')
+    first = tape([('A', t, 1.0, 100), ('A', t, 1.1, 100)])
+    later = tape([('A', t, 1.0, 100), ('A', t, 1.1, 100), ('A', t, 1.2, 100), ('A', t + pd.Timedelta(seconds=1), 1.3, 100)])
+    updated = update_trade_stats(compute_trade_stats(first), later)
+    assert_frame_equal(by_symbol(updated), by_symbol(compute_trade_stats(later)), check_dtype=False)
+
+def test_repeated_download_without_new_ticks_is_idempotent():
+    full = day_tape(40)
+    stats = compute_trade_stats(full)
+    assert_frame_equal(by_symbol(update_trade_stats(stats, full)), by_symbol(stats), check_dtype=False)
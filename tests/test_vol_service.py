@@ -0,0 +1,12 @@
+import numpy as np
+import pandas as pd
+from vol_service import apply_garch_sigma
+
+def test_garch_sigma_replaces_realized_where_fitted():
+    quotes = pd.DataFrame({'symbol': ['CACB2401', 'CFPT2401'], 'underlying': ['ACB', 'FPT'],
+                           'underlying_sigma': [0.3, 0.4]})
+    garch = pd.DataFrame({'symbol': ['ACB', 'FPT'], 'sigma': [0.25, np.nan]})
+    out = apply_garch_sigma(quotes, garch)
+    assert list(out['underlying_sigma']) == [0.25, 0.4]
+    assert list(out['sigma_source']) == ['garch', 'realized']
+    assert list(out['realized_sigma']) == [0.3, 0.4]
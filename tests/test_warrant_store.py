@@ -0,0 +1,68 @@
+import threading
+import pandas as pd
+import pytest
+import warrant_store
+from warrant_store import read_table, write_table
+
+pytest.importorskip('pyarrow')
+
+SYMBOLS = [f'C{u}{i:04d}' for u in ('ACB', 'FPT', 'HPG', 'VNM') for i in range(50)]
+
+def snapshot(gen):
+    return pd.DataFrame({'symbol': SYMBOLS, 'close': float(gen), 'gen': gen})
+
+def test_write_then_read_round_trip(tmp_path):
+    write_table(snapshot(1), str(tmp_path), date='2024-01-02')
+    write_table(snapshot(2), str(tmp_path), date='2024-01-02')
+    df = read_table(str(tmp_path), columns=['symbol', 'gen'])
+    assert sorted(df['symbol']) == sorted(SYMBOLS)
+    assert set(df['gen']) == {2}
+    sub = read_table(str(tmp_path), columns=['symbol', 'gen'], symbols=['CFPT0003'])
+    assert list(sub['symbol']) == ['CFPT0003']
+
+def test_concurrent_reads_see_complete_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(warrant_store, 'VERSION_GRACE', 0.5)
+    root = str(tmp_path)
+    write_table(snapshot(0), root, date='2024-01-02')
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        gen = 1
+        while not stop.is_set():
+            write_table(snapshot(gen), root, date='2024-01-02')
+            gen += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(200):
+            try:
+                df = read_table(root, columns=['symbol', 'gen'])
+            except Exception as e:
+                errors.append(repr(e))
+                continue
+            if len(df) != len(SYMBOLS) or df['gen'].nunique() != 1:
+                errors.append(f'{len(df)} dòng, {df["gen"].nunique()} thế hệ')
+    finally:
+        stop.set()
+        thread.join()
+    assert errors == []
+
+def test_superseded_version_kept_for_grace_period(tmp_path, monkeypatch):
+    import os, time
+    root = str(tmp_path)
+    write_table(snapshot(1), root, date='2024-01-02')
+    old = os.path.join(root, warrant_store.VERSIONS_DIR, warrant_store._current_version(root, '2024-01-02'))
+    # Phiên bản được tạo từ một giờ trước (snapshot đầu ngày) nhưng mới bị thay ngay bây giờ
+    hour_ago = time.time() - 3600
+    os.utime(old, (hour_ago, hour_ago))
+    write_table(snapshot(2), root, date='2024-01-02')
+    assert os.path.isdir(old)
+    write_table(snapshot(3), root, date='2024-01-02')
+    assert os.path.isdir(old)
+    # Hết thời hạn tính từ lúc bị thay thì mới bị xóa
+    monkeypatch.setattr(warrant_store, 'VERSION_GRACE', 0)
+    time.sleep(0.01)
+    write_table(snapshot(4), root, date='2024-01-02')
+    assert not os.path.exists(old)
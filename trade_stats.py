@@ -0,0 +1,81 @@
+# trade_stats.py
+import numpy as np, pandas as pd
+
+STATS_COLUMNS = ['symbol', 'volume_sum', 'trade_count', 'last_trade_price', 'vwap', 'pv_sum',
+                 'last_trade_time', 'last_time_count']
+
+def _tape(trades):
+    """Băng lệnh với cột time chuẩn hóa, xếp theo thời gian (ổn định: lệnh cùng giây giữ thứ tự băng)."""
+    if 'time' not in trades:
+        return trades.assign(time=pd.NaT)
+    trades = trades.assign(time=pd.to_datetime(trades['time']))
+    return trades.sort_values('time', kind='mergesort')
+
+def compute_trade_stats(trades):
+    """Thống kê giao dịch của mọi mã trong một lượt groupby (cột symbol, price, volume, time).
+
+    Trả về một dòng mỗi mã: volume_sum, trade_count, last_trade_price (lệnh cuối theo thời gian),
+    vwap, pv_sum (tổng giá × khối lượng), last_trade_time và last_time_count (số lệnh đã tính tại đúng
+    last_trade_time) để cộng dồn lệnh mới bằng update_trade_stats/merge_trade_stats.
+    """
+    if trades is None or len(trades) == 0:
+        return pd.DataFrame(columns=STATS_COLUMNS)
+    trades = _tape(trades)
+    price = trades['price'] if 'price' in trades else pd.Series(np.nan, index=trades.index)
+    volume = trades['volume'] if 'volume' in trades else pd.Series(np.nan, index=trades.index)
+    g = pd.DataFrame({'symbol': trades['symbol'], 'price': price, 'volume': volume, 'pv': price*volume,
+                      'time': trades['time']}).groupby('symbol', sort=False)
+    at_last = trades['time'] == g['time'].transform('max')
+    stats = pd.DataFrame({
+        'volume_sum': g['volume'].sum(min_count=1),
+        'trade_count': g.size(),
+        'last_trade_price': g['price'].last(),
+        'pv_sum': g['pv'].sum(min_count=1),
+        'last_trade_time': g['time'].max(),
+        'last_time_count': at_last.groupby(trades['symbol'], sort=False).sum(),
+    })
+    stats['vwap'] = stats['pv_sum'] / stats['volume_sum'].replace(0, np.nan)
+    return stats.reset_index()[STATS_COLUMNS]
+
+def merge_trade_stats(old, new):
+    """Cộng dồn thống kê của lô lệnh mới (new) vào thống kê đã có (old) mà không đọc lại băng lệnh cũ."""
+    if old is None or len(old) == 0:
+        return new
+    if new is None or len(new) == 0:
+        return old
+    both = pd.concat([old, new], ignore_index=True)
+    both['last_trade_time'] = pd.to_datetime(both['last_trade_time'])
+    latest = both.groupby('symbol', sort=False)['last_trade_time'].transform('max')
+    both['at_latest'] = both['last_time_count'].where(both['last_trade_time'] == latest, 0)
+    g = both.groupby('symbol', sort=False)
+    stats = pd.DataFrame({
+        'volume_sum': g['volume_sum'].sum(min_count=1),
+        'trade_count': g['trade_count'].sum(),
+        'last_trade_price': g['last_trade_price'].last(),
+        'pv_sum': g['pv_sum'].sum(min_count=1),
+        'last_trade_time': g['last_trade_time'].max(),
+        'last_time_count': g['at_latest'].sum(),
+    })
+    stats['vwap'] = stats['pv_sum'] / stats['volume_sum'].replace(0, np.nan)
+    return stats.reset_index()[STATS_COLUMNS]
+
+def update_trade_stats(old, trades):
+    """Cập nhật thống kê trong ngày từ băng lệnh vừa tải: chỉ gộp các lệnh sau lệnh cuối đã tính.
+
+    Băng có thể chỉ là cửa sổ các lệnh gần nhất (trượt theo thời gian), nên lệnh mới được nhận theo
+    thời gian chứ không theo vị trí: sau last_trade_time, hoặc tại đúng last_trade_time nhưng vượt quá
+    last_time_count lệnh đã tính. Thiếu cột time (hay thống kê cũ thiếu mốc thời gian) thì tính lại từ băng.
+    """
+    if (old is None or len(old) == 0 or trades is None or 'time' not in trades
+            or not {'last_trade_time', 'last_time_count'} <= set(old.columns)):
+        return compute_trade_stats(trades)
+    if len(trades) == 0:
+        return old[STATS_COLUMNS]
+    trades = _tape(trades)
+    prev = old.set_index('symbol')
+    last = trades['symbol'].map(pd.to_datetime(prev['last_trade_time']))
+    seen = trades['symbol'].map(prev['last_time_count']).fillna(0)
+    at_last = trades['time'] == last
+    rank = at_last.astype(int).groupby(trades['symbol'], sort=False).cumsum()
+    fresh = last.isna() | (trades['time'] > last) | (at_last & (rank > seen))
+    return merge_trade_stats(old[STATS_COLUMNS], compute_trade_stats(trades[fresh]))
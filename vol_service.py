@@ -0,0 +1,136 @@
+# vol_service.py
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np, pandas as pd
+
+GARCH_PARAMS_JSON = 'garch_params.json'
+PARAM_NAMES = ['mu', 'omega', 'alpha[1]', 'beta[1]']
+
+def fit_garch(returns, starting_values=None):
+    """Ước lượng GARCH(1,1) trên chuỗi lợi suất (%), khởi động từ tham số cũ nếu có.
+
+    Trả về dict tham số (mu, omega, alpha[1], beta[1]) và sigma2_next là phương sai có điều kiện
+    dự báo cho phiên kế tiếp.
+    """
+    from arch import arch_model
+    model = arch_model(returns, vol='Garch', p=1, q=1)
+    sv = np.array([starting_values[name] for name in PARAM_NAMES]) if starting_values else None
+    res = model.fit(disp='off', starting_values=sv)
+    params = {name: float(res.params[name]) for name in PARAM_NAMES}
+    sigma2_next = float(res.forecast(horizon=1, reindex=False).variance.iloc[-1, 0])
+    return params, sigma2_next
+
+def garch_step(params, sigma2_next, ret):
+    """Cập nhật một bước khi có thêm một phiên: phương sai của phiên đó là sigma2_next đã dự báo."""
+    resid = ret - params['mu']
+    return params['omega'] + params['alpha[1]']*resid**2 + params['beta[1]']*sigma2_next
+
+def _fit_job(job):
+    symbol, returns, starting_values = job
+    try:
+        return symbol, fit_garch(pd.Series(returns), starting_values), None
+    except Exception as e:
+        return symbol, None, str(e)
+
+class GarchService:
+    """Biến động GARCH(1,1) cho nhiều mã cơ sở, lưu tham số giữa các lần chạy.
+
+    Với mỗi mã: chưa có tham số hoặc có nhiều phiên mới (hoặc đã quá refit_every phiên kể từ lần
+    ước lượng đầy đủ gần nhất) thì ước lượng lại, khởi động từ tham số cũ, song song trên nhiều
+    tiến trình; chỉ có đúng một phiên mới thì cập nhật một bước theo công thức GARCH, không ước lượng lại.
+    """
+
+    def __init__(self, path=GARCH_PARAMS_JSON, max_workers=None, refit_every=20, window=500):
+        self.path = path
+        self.max_workers = max_workers
+        self.refit_every = refit_every
+        # Chỉ dùng `window` phiên gần nhất khi ước lượng lại
+        self.window = window
+        self.state = self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                return json.load(f)
+        return {}
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def run(self, histories):
+        """histories: dict mã -> DataFrame nến (time, close). Trả về bảng sigma theo mã."""
+        jobs = []
+        for symbol, hist in histories.items():
+            if hist is None or len(hist) < 30 or 'close' not in hist:
+                continue
+            times = pd.to_datetime(hist['time']).dt.strftime('%Y-%m-%d').to_numpy()
+            ret = (100 * hist['close'].pct_change()).to_numpy()
+            st = self.state.get(symbol)
+            new = int((times > st['last_date']).sum()) if st else None
+            if st and new == 0:
+                continue
+            if st and new == 1 and st['since_fit'] < self.refit_every and np.isfinite(ret[-1]):
+                st['sigma2_next'] = garch_step(st['params'], st['sigma2_next'], float(ret[-1]))
+                st.update(last_date=times[-1], since_fit=st['since_fit'] + 1)
+                continue
+            series = pd.Series(ret[1:][-self.window:], index=times[1:][-self.window:])
+            jobs.append((symbol, series.to_numpy(), st['params'] if st else None))
+            if st is None:
+                st = self.state[symbol] = {}
+            st['pending_last_date'] = times[-1]
+        if jobs:
+            workers = self.max_workers or os.cpu_count() or 1
+            if workers == 1 or len(jobs) == 1:
+                results = map(_fit_job, jobs)
+            else:
+                with ProcessPoolExecutor(workers) as ex:
+                    results = list(ex.map(_fit_job, jobs))
+            for symbol, fitted, error in results:
+                st = self.state[symbol]
+                last_date = st.pop('pending_last_date')
+                if fitted is None:
+                    logging.warning("Không ước lượng được GARCH cho %s: %s", symbol, error)
+                    if 'params' not in st:
+                        del self.state[symbol]
+                    continue
+                params, sigma2_next = fitted
+                st.update(params=params, sigma2_next=sigma2_next, last_date=last_date, since_fit=0)
+        self.save()
+        return self.table()
+
+    def table(self):
+        """sigma_daily (% / phiên) và sigma (năm hóa, dạng thập phân như các route định giá)."""
+        rows = [{'symbol': s, 'last_date': st['last_date'], 'sigma_daily': np.sqrt(st['sigma2_next']),
+                 'sigma': np.sqrt(st['sigma2_next']*252)/100} for s, st in self.state.items()]
+        return pd.DataFrame(rows, columns=['symbol', 'last_date', 'sigma_daily', 'sigma'])
+
+def update_underlying_vols(underlyings, fetch=None, service=None, **fetch_kwargs):
+    """Cập nhật GARCH cho mọi mã cơ sở; lịch sử lấy qua kho nến nên chỉ tải phần phiên mới."""
+    from fetch_pipeline import fetch_many
+    if fetch is None:
+        from warrant_scraper import get_warrant_history as fetch
+    service = service or GarchService()
+    underlyings = sorted({u for u in underlyings if isinstance(u, str) and u != 'UNKNOWN'})
+    histories, _ = fetch_many(fetch, underlyings, **fetch_kwargs)
+    return service.run(histories)
+
+def apply_garch_sigma(quotes, garch):
+    """Dùng sigma GARCH (dự báo phiên kế tiếp, năm hóa) làm underlying_sigma khi định giá.
+
+    Mã cơ sở chưa có GARCH hoặc sigma không hợp lệ giữ sigma lịch sử; sigma lịch sử được giữ lại ở
+    cột realized_sigma, cột sigma_source cho biết nguồn đã dùng.
+    """
+    if garch is None or len(garch) == 0 or 'underlying' not in quotes:
+        return quotes
+    g = garch.set_index('symbol')['sigma']
+    g = g[np.isfinite(g) & (g > 0)]
+    fitted = quotes['underlying'].map(g)
+    out = quotes.assign(realized_sigma=quotes.get('underlying_sigma'))
+    out['underlying_sigma'] = fitted.where(fitted.notna(), out['realized_sigma'])
+    out['sigma_source'] = np.where(fitted.notna(), 'garch', 'realized')
+    return out
@@ -1,37 +1,141 @@
 # warrant_scraper.py
-from vnstock import Listing, Quote, Trading
 import pandas as pd
 import datetime
+import functools
+import threading
+import time
+from collections import OrderedDict
+import metrics
+from history_store import default_store
 
+class TTLCache:
+    """Cache LRU có thời hạn (TTL), an toàn đa luồng, có đếm hit/miss."""
+
+    def __init__(self, ttl, maxsize=256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        """Trả về (True, giá trị) nếu còn hạn, ngược lại (False, None)."""
+        with self.lock:
+            item = self.data.get(key)
+            if item is not None and time.monotonic() - item[0] < self.ttl:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return True, item[1]
+            if item is not None:
+                del self.data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic(), value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self.data), 'ttl': self.ttl, 'maxsize': self.maxsize}
+
+_caches = {}
+# Mặc định intraday() của vnstock chỉ trả 100 lệnh gần nhất; xin cả băng trong ngày (30000 là mức
+# vnstock còn chấp nhận không cảnh báo, thừa cho một chứng quyền)
+INTRADAY_PAGE_SIZE = 30_000
+
+def ttl_cache(ttl, maxsize=256):
+    """Decorator cache kết quả theo tham số gọi; DataFrame được trả về dạng bản sao."""
+    def decorator(func):
+        cache = _caches[func.__name__] = TTLCache(ttl, maxsize)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            found, value = cache.get(key)
+            if not found:
+                value = func(*args, **kwargs)
+                cache.set(key, value)
+            return value.copy() if isinstance(value, (pd.DataFrame, pd.Series)) else value
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+def cache_stats():
+    """Thống kê hit/miss của từng endpoint vnstock được cache."""
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+@ttl_cache(ttl=6*3600, maxsize=1)
+@metrics.timed('provider_request', endpoint='listing')
 def get_all_warrants():
     """Lấy danh sách tất cả mã chứng quyền niêm yết."""
+    # vnstock import mất vài giây nên chỉ import khi thật sự gọi nguồn dữ liệu
+    from vnstock import Listing
     return Listing(source="VCI").all_covered_warrant()
 
-def get_warrant_history(symbol, start="2020-01-01", end=None):
-    """Lấy giá lịch sử (đồ thị nến) của chứng quyền. end=None sẽ lấy tới ngày hiện tại."""
+def listing_symbols():
+    """Danh sách mã chứng quyền (chữ hoa, đã sắp xếp); vnstock trả Series, bản cũ trả bảng có cột symbol."""
+    warrants = get_all_warrants()
+    symbols = warrants['symbol'] if isinstance(warrants, pd.DataFrame) else warrants
+    return sorted(str(s).upper() for s in symbols)
+
+def get_warrant_history(symbol, start="2020-01-01", end=None, store=None):
+    """Lấy giá lịch sử (đồ thị nến) của chứng quyền. end=None sẽ lấy tới ngày hiện tại.
+
+    Dữ liệu được lưu trong kho cục bộ (history_store), mỗi lần gọi chỉ tải phần còn thiếu.
+    """
     if end is None:
         end = datetime.date.today().strftime("%Y-%m-%d")
+    store = store or default_store()
+    return store.update(symbol.upper(), fetch_warrant_history, start, end)
+
+@metrics.timed('provider_request', endpoint='history')
+def fetch_warrant_history(symbol, start, end):
+    """Tải trực tiếp nến của chứng quyền từ vnstock (không qua kho cục bộ)."""
+    from vnstock import Quote
     # Sử dụng đúng thứ tự tham số cho Quote: source, symbol
     return Quote(source="VCI", symbol=symbol.upper()).history(start=start, end=end)
 
+@ttl_cache(ttl=30, maxsize=1024)
+@metrics.timed('provider_request', endpoint='intraday')
 def get_warrant_intraday(symbol):
-    """Lấy dữ liệu khớp lệnh trong ngày (intraday) của chứng quyền."""
-    return Quote(symbol, source="VCI").intraday()
+    """Lấy dữ liệu khớp lệnh trong ngày (intraday) của chứng quyền, cả băng chứ không chỉ trang đầu."""
+    from vnstock import Quote
+    return Quote(symbol, source="VCI").intraday(page_size=INTRADAY_PAGE_SIZE)
 
+@ttl_cache(ttl=15, maxsize=1024)
+@metrics.timed('provider_request', endpoint='price_depth')
 def get_warrant_price_depth(symbol):
     """Lấy khối lượng giao dịch theo bước giá (order book depth) của chứng quyền."""
+    from vnstock import Quote
     return Quote(symbol, source="VCI").price_depth()
 
+@ttl_cache(ttl=15, maxsize=1024)
+@metrics.timed('provider_request', endpoint='price_board')
 def get_warrant_price_board(symbol):
     """Lấy thông tin bảng giá của chứng quyền."""
+    from vnstock import Trading
     return Trading(symbol, source="VCI").price_board([symbol])
 
+@ttl_cache(ttl=24*3600, maxsize=16)
+@metrics.timed('provider_request', endpoint='fx')
 def fetch_fx_rate(base="USD", quote="VND"):
     """Lấy tỷ giá ngoại tệ (ví dụ: USD/VND) từ vnstock."""
     from vnstock import Vnstock
-    # Vnstock hỗ trợ lấy tỷ giá qua lớp Vnstock
+    # Vnstock hỗ trợ lấy tỷ giá qua lớp Vnstock; chỉ cần vài phiên gần nhất để đọc giá đóng cửa cuối
     fx = Vnstock(symbol=f"{base}{quote}", source="MSN")
-    df = fx.stock().quote.history()
+    today = datetime.date.today()
+    df = fx.stock().quote.history(start=(today - datetime.timedelta(days=14)).strftime("%Y-%m-%d"),
+                                  end=today.strftime("%Y-%m-%d"))
     # Lấy tỷ giá mới nhất
     if not df.empty:
         return float(df['close'].iloc[-1])
@@ -0,0 +1,121 @@
+# warrant_store.py
+import datetime
+import os
+import re
+import shutil
+import time
+import uuid
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+except ImportError:  # không có pyarrow thì dùng lại file CSV cũ
+    pa = None
+
+SNAPSHOT_DIR = os.path.join('data', 'snapshots')
+TRADE_DIR = os.path.join('data', 'trades')
+TRADE_STATS_DIR = os.path.join('data', 'trade_stats')
+# Mỗi lần ghi là một phiên bản riêng trong root/.versions; con trỏ root/date=YYYY-MM-DD.current chỉ tới
+# phiên bản hiện hành. Phiên bản cũ được giữ thêm VERSION_GRACE giây kể từ lúc bị thay (mtime của thư mục
+# được đặt lại đúng lúc đổi con trỏ) cho các lượt đọc đang dở.
+VERSIONS_DIR = '.versions'
+POINTER_SUFFIX = '.current'
+VERSION_GRACE = 300
+
+def underlying_of(symbol):
+    """Mã cơ sở suy từ mã chứng quyền (CACB2404 -> ACB); không khớp mẫu thì trả về 'UNKNOWN'."""
+    m = re.fullmatch(r'C([A-Z0-9]{3})\d{4}', str(symbol).upper())
+    return m.group(1) if m else 'UNKNOWN'
+
+def latest_date(root):
+    """Ngày của phân vùng mới nhất trong thư mục root (date=YYYY-MM-DD), None nếu chưa có."""
+    if not os.path.isdir(root):
+        return None
+    dates = [name[5:].removesuffix(POINTER_SUFFIX) for name in os.listdir(root) if name.startswith('date=')]
+    return max(dates) if dates else None
+
+def _current_version(root, date):
+    try:
+        with open(os.path.join(root, f'date={date}{POINTER_SUFFIX}')) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def partition_path(root, date):
+    """Thư mục dữ liệu hiện hành của một ngày: phiên bản theo con trỏ, hoặc thư mục date=... kiểu cũ."""
+    version = _current_version(root, date)
+    if version is not None:
+        return os.path.join(root, VERSIONS_DIR, version)
+    part = os.path.join(root, f'date={date}')
+    return part if os.path.isdir(part) else None
+
+def _drop_old_versions(root, date, keep):
+    versions = os.path.join(root, VERSIONS_DIR)
+    now = time.time()
+    for name in os.listdir(versions):
+        path = os.path.join(versions, name)
+        if name.startswith(f'{date}-') and name != keep and now - os.path.getmtime(path) > VERSION_GRACE:
+            shutil.rmtree(path, ignore_errors=True)
+
+def write_table(df, root, date=None, legacy_csv=None):
+    """Ghi bảng dạng Parquet, phân vùng theo ngày và mã cơ sở; thay toàn bộ dữ liệu của ngày đó.
+
+    Bảng được ghi đầy đủ vào một phiên bản mới rồi mới đổi con trỏ bằng os.replace, nên người đọc
+    đồng thời chỉ thấy bảng cũ hoặc bảng mới, không bao giờ thấy bảng ghi dở.
+    Không có pyarrow thì ghi ra legacy_csv như trước (cũng qua file tạm + os.replace).
+    """
+    if pa is None:
+        tmp = f'{legacy_csv}.tmp-{uuid.uuid4().hex}'
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, legacy_csv)
+        return
+    date = date or datetime.date.today().strftime('%Y-%m-%d')
+    version = f'{date}-{time.strftime("%Y%m%dT%H%M%S")}-{uuid.uuid4().hex[:8]}'
+    part = os.path.join(root, VERSIONS_DIR, version)
+    if 'underlying' in df:
+        df = df.assign(underlying=df['underlying'].fillna(df['symbol'].map(underlying_of)))
+    else:
+        df = df.assign(underlying=df['symbol'].map(underlying_of))
+    ds.write_dataset(pa.Table.from_pandas(df, preserve_index=False), part, format='parquet',
+                     partitioning=ds.partitioning(pa.schema([('underlying', pa.string())]), flavor='hive'),
+                     existing_data_behavior='error')
+    pointer = os.path.join(root, f'date={date}{POINTER_SUFFIX}')
+    tmp = os.path.join(root, f'.{version}{POINTER_SUFFIX}.tmp')
+    with open(tmp, 'w') as f:
+        f.write(version)
+    previous = _current_version(root, date)
+    os.replace(tmp, pointer)
+    if previous is not None and previous != version:
+        # Thời hạn giữ lại tính từ lúc phiên bản cũ bị thay, không phải lúc nó được tạo
+        try:
+            os.utime(os.path.join(root, VERSIONS_DIR, previous))
+        except FileNotFoundError:
+            pass
+    _drop_old_versions(root, date, keep=version)
+
+def read_table(root, columns=None, symbols=None, date=None, legacy_csv=None):
+    """Đọc bảng của một ngày (mặc định ngày mới nhất), chỉ các cột và mã cần dùng.
+
+    Lọc theo symbol được đẩy xuống tầng đọc Parquet, file được đọc qua memory map. Không lọc phân vùng
+    theo mã cơ sở suy từ mã chứng quyền vì phân vùng dùng mã cơ sở theo điều khoản, có thể khác mẫu mã.
+    Trả về None nếu chưa có dữ liệu.
+    """
+    date = date or latest_date(root)
+    # Đọc con trỏ một lần: cả lượt đọc dùng cùng một phiên bản dù có lượt ghi mới xen vào
+    part = partition_path(root, date) if pa is not None and date is not None else None
+    if part is None:
+        if legacy_csv is None or not os.path.exists(legacy_csv):
+            return None
+        df = pd.read_csv(legacy_csv, usecols=lambda c: columns is None or c in columns)
+        return df[df['symbol'].isin(symbols)] if symbols is not None else df
+    dataset = ds.dataset(part, format='parquet',
+                         filesystem=pafs.LocalFileSystem(use_mmap=True),
+                         partitioning=ds.partitioning(pa.schema([('underlying', pa.string())]), flavor='hive'))
+    expr = None
+    if symbols is not None:
+        expr = ds.field('symbol').isin([str(s) for s in symbols])
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()